@@ -0,0 +1,118 @@
+"""Hourly analytics rollups.
+
+One `analytics_hourly` document per UTC hour keyed by "YYYY-MM-DDTHH":
+
+    {"_id": "2026-02-07T14", "date": "2026-02-07", "hour": 14,
+     "calls": 31, "sentiment_sum": 4.2, "sentiment_count": 27,
+     "issues": {"Billing Dispute": 9, ...}, "agent_alerts": {"AGT-001": 3, ...}}
+
+A call counts toward the hour it started in: `calls` and its scenario
+issue when it starts, sentiment and alerts when it ends. When the LLM
+summary later names a different issue, the count moves to it. Rebuild from history with:
+
+    python analytics_rollup.py [--since YYYY-MM-DD]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from mongo_cli import as_datetime, cli_db
+
+ROLLUP_COLLECTION = "analytics_hourly"
+
+
+def bucket_key(started_at):
+    dt = as_datetime(started_at)
+    return {"_id": dt.strftime("%Y-%m-%dT%H")}, {"date": dt.strftime("%Y-%m-%d"), "hour": dt.hour}
+
+
+def _field_key(name):
+    # Mongo field names can't contain dots or start with $
+    return (name or "Unknown").replace(".", "_").lstrip("$") or "Unknown"
+
+
+def call_started_update(started_at, primary_issue):
+    """(filter, update) counting a new call and its issue in its start hour; apply with upsert."""
+    key, fields = bucket_key(started_at)
+    return key, {"$set": fields, "$inc": {"calls": 1, f"issues.{_field_key(primary_issue)}": 1}}
+
+
+def issue_changed_update(started_at, old_issue, new_issue):
+    """(filter, update) moving a call from one issue to another, or None if unchanged."""
+    old_field, new_field = _field_key(old_issue), _field_key(new_issue)
+    if old_field == new_field:
+        return None
+    key, _ = bucket_key(started_at)
+    return key, {"$inc": {f"issues.{old_field}": -1, f"issues.{new_field}": 1}}
+
+
+def call_ended_update(started_at, overall_sentiment, agent_id, alert_count):
+    """(filter, update) folding an ended call's summary into its start hour; apply with upsert."""
+    key, fields = bucket_key(started_at)
+    inc = {
+        "sentiment_sum": overall_sentiment or 0,
+        "sentiment_count": 1,
+    }
+    if alert_count:
+        inc[f"agent_alerts.{_field_key(agent_id)}"] = alert_count
+    return key, {"$set": fields, "$inc": inc}
+
+
+async def hourly_buckets(db, day: datetime):
+    return await db[ROLLUP_COLLECTION].find({"date": day.strftime("%Y-%m-%d")}).to_list(24)
+
+
+async def backfill(db, since=None):
+    """Rebuild rollups from the calls collection, replacing buckets from `since` on."""
+    query = {}
+    if since:
+        query["started_at"] = {"$gte": since}
+    buckets = {}
+    cursor = db.calls.find(query, {
+        "_id": 0, "started_at": 1, "status": 1, "agent.id": 1, "alerts_triggered": 1,
+        "ai_summary.overall_sentiment": 1, "ai_summary.primary_issue": 1,
+    })
+    async for call in cursor:
+        if not call.get("started_at"):
+            continue
+        key, fields = bucket_key(call["started_at"])
+        bucket = buckets.setdefault(key["_id"], {
+            **fields, "calls": 0, "sentiment_sum": 0, "sentiment_count": 0,
+            "issues": {}, "agent_alerts": {},
+        })
+        bucket["calls"] += 1
+        summary = call.get("ai_summary") or {}
+        issue = _field_key(summary.get("primary_issue"))
+        bucket["issues"][issue] = bucket["issues"].get(issue, 0) + 1
+        if call.get("status") != "ended":
+            continue
+        bucket["sentiment_sum"] += summary.get("overall_sentiment") or 0
+        bucket["sentiment_count"] += 1
+        alert_count = len(call.get("alerts_triggered") or [])
+        if alert_count:
+            agent = _field_key((call.get("agent") or {}).get("id"))
+            bucket["agent_alerts"][agent] = bucket["agent_alerts"].get(agent, 0) + alert_count
+
+    rollups = db[ROLLUP_COLLECTION]
+    if since:
+        await rollups.delete_many({"_id": {"$gte": since.strftime("%Y-%m-%dT%H")}})
+    else:
+        await rollups.delete_many({})
+    for bucket_id, bucket in buckets.items():
+        await rollups.replace_one({"_id": bucket_id}, bucket, upsert=True)
+    return len(buckets)
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Rebuild analytics_hourly rollups from call history")
+    parser.add_argument("--since", help="only rebuild buckets from this UTC date (YYYY-MM-DD)")
+    args = parser.parse_args()
+    since = as_datetime(args.since) if args.since else None
+
+    async with cli_db() as db:
+        count = await backfill(db, since)
+    print(f"Rebuilt {count} hourly buckets")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class BulkWriter:
+    """Write-behind buffer that flushes queued writes with one unordered bulk_write per collection.
+
+    Updates with an identical filter within a flush window are merged into a
+    single operation ($set last-wins, $push appended in order, $inc summed).
+    Different filters that match the same document (e.g. {"call_id", "status"}
+    and {"call_id"}) stay separate operations and the unordered execution may
+    apply them in any order, so such updates must touch disjoint fields.
+    Pending writes are flushed every `flush_interval` seconds, as soon as
+    `max_pending` operations are queued, and on stop().
+
+    Only operations known not to have been applied are retried: the ones a
+    BulkWriteError reports as failed are re-queued for up to `retries` later
+    flushes, ahead of newer writes to the collection. Any other error (a
+    network error or timeout, after the driver's own retryable-write attempt)
+    may have left the batch applied, and re-running its $inc / $push would
+    double-count, so that batch is logged and dropped. Dropped operations are
+    counted in `dropped`.
+    """
+
+    MERGEABLE = ("$set", "$push", "$inc")
+
+    def __init__(self, db, flush_interval=0.25, max_pending=1000, retries=3):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retries = retries
+        self.dropped = 0
+        self._inserts = {}
+        self._updates = {}
+        self._retry = {}
+        self._pending = 0
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._closing = False
+
+    def insert_one(self, collection, document):
+        self._inserts.setdefault(collection, []).append(document)
+        self._added()
+
+    def update_one(self, collection, filter, update, upsert=False):
+        unsupported = set(update) - set(self.MERGEABLE)
+        if unsupported:
+            raise ValueError(f"BulkWriter cannot merge update operators: {sorted(unsupported)}")
+        key = (tuple(sorted(filter.items())), upsert)
+        updates = self._updates.setdefault(collection, {})
+        if key not in updates:
+            updates[key] = (filter, {}, upsert)
+            self._added()
+        merged = updates[key][1]
+        for field, value in update.get("$set", {}).items():
+            merged.setdefault("$set", {})[field] = value
+        for field, value in update.get("$push", {}).items():
+            items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+            merged.setdefault("$push", {}).setdefault(field, {"$each": []})["$each"].extend(items)
+        for field, value in update.get("$inc", {}).items():
+            incs = merged.setdefault("$inc", {})
+            incs[field] = incs.get(field, 0) + value
+
+    def _added(self):
+        self._pending += 1
+        if self._pending >= self.max_pending:
+            self._wake.set()
+
+    async def flush(self):
+        async with self._lock:
+            inserts, updates, retry = self._inserts, self._updates, self._retry
+            self._inserts, self._updates, self._retry, self._pending = {}, {}, {}, 0
+            for collection in set(inserts) | set(updates) | set(retry):
+                ops = [(InsertOne(doc), 0) for doc in inserts.get(collection, [])]
+                ops += [(UpdateOne(f, u, upsert=up), 0) for f, u, up in updates.get(collection, {}).values()]
+                # Retried writes go first, in their own batch, so newer ones can't overtake them
+                if retry.get(collection) and not await self._write(collection, retry[collection]):
+                    self._retry[collection].extend(ops)
+                    continue
+                if ops:
+                    await self._write(collection, ops)
+
+    async def _write(self, collection, ops):
+        """bulk_write (operation, attempts) pairs; returns False if the batch was re-queued."""
+        try:
+            await self.db[collection].bulk_write([op for op, _ in ops], ordered=False)
+            return True
+        except BulkWriteError as e:
+            # The rest of an unordered batch was applied; only the listed ops weren't
+            failed = [ops[error["index"]] for error in e.details.get("writeErrors", [])
+                      if error.get("code") != DUPLICATE_KEY]
+            duplicates = len(e.details.get("writeErrors", [])) - len(failed)
+            retry = [(op, attempts + 1) for op, attempts in failed if attempts < self.retries]
+            self.dropped += duplicates + len(failed) - len(retry)
+            logger.error(f"Bulk write to {collection}: {len(failed) + duplicates} of {len(ops)} ops failed, "
+                         f"{len(retry)} re-queued: {e}")
+            if not retry:
+                return True
+            self._retry.setdefault(collection, []).extend(retry)
+            return False
+        except Exception as e:
+            # Outcome unknown: the server may have applied the batch
+            self.dropped += len(ops)
+            logger.error(f"Bulk write to {collection} failed, dropping {len(ops)} ops: {e}")
+            return True
+
+    def stats(self):
+        return {
+            "pending": self._pending,
+            "retrying": sum(len(ops) for ops in self._retry.values()),
+            "dropped": self.dropped,
+        }
+
+    async def start(self):
+        if not self._task:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            # Let an in-flight flush finish rather than cancelling it mid-write
+            self._closing = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        leftover = sum(len(ops) for ops in self._retry.values())
+        if leftover:
+            self.dropped += leftover
+            self._retry = {}
+            logger.error(f"Bulk writer stopped with {leftover} unwritten ops")
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Bulk writer flush error: {e}", exc_info=True)
@@ -1,12 +1,22 @@
 import random
 import asyncio
+import hashlib
 import uuid
 import logging
+from collections import deque
 from datetime import datetime, timezone
-from ai_engine import analyze_message, summarize_call_llm, generate_fallback_summary
+from pymongo.errors import BulkWriteError
+from bulk_writer import BulkWriter
+from analytics_rollup import ROLLUP_COLLECTION, call_started_update, call_ended_update
+from transcripts import TRANSCRIPT_COLLECTION, transcript_doc
+from live_metrics import metrics_update_message
+from ai_engine import FallbackSummarizer, analyze_message, analyze_messages
 
 logger = logging.getLogger(__name__)
 
+SENTIMENT_WINDOW = 10
+MAX_CONCURRENT_PROGRESS = 50
+
 AGENT_PROFILES = [
     {"agent_id": "AGT-001", "name": "Sarah Mitchell", "skills": ["billing", "retention", "technical"], "avatar_idx": 0},
     {"agent_id": "AGT-002", "name": "Michael Torres", "skills": ["technical", "billing"], "avatar_idx": 1},
@@ -247,37 +257,103 @@ TRIGGER_SCENARIOS = {
 }
 
 
+DEFAULT_CONFIG = {
+    "num_calls": 12,
+    "issue_frequency": 0.3,
+    "sentiment_distribution": "normal",
+    "message_interval": 4,
+}
+
+
+def shard_of(call_id, shards):
+    """Stable partition of a call_id across `shards` simulator workers (unlike hash(), same in every process)."""
+    return int(hashlib.sha1(call_id.encode()).hexdigest()[:8], 16) % shards
+
+
+def new_sentiment_stats():
+    return {"count": 0, "sum": 0.0, "min": None, "max": None, "recent": deque(maxlen=SENTIMENT_WINDOW)}
+
+
+def update_sentiment_stats(stats, sentiment):
+    """Fold one utterance's sentiment into running per-call aggregates."""
+    stats["count"] += 1
+    stats["sum"] += sentiment
+    stats["min"] = sentiment if stats["min"] is None else min(stats["min"], sentiment)
+    stats["max"] = sentiment if stats["max"] is None else max(stats["max"], sentiment)
+    stats["recent"].append(sentiment)
+    return stats["sum"] / stats["count"]
+
+
+def sentiment_stats_doc(stats):
+    return {**stats, "recent": list(stats["recent"])}
+
+
+async def clear_stale_calls(db, partition=None, batch_size=500):
+    """Delete calls (and their transcripts and active alerts) left active by a
+    previous run, one batch at a time; returns how many calls were removed.
+
+    The stale set is snapshotted first, so calls and alerts created while this
+    runs are left alone. `partition(call_id)` limits it to the calls it returns
+    True for; without one, active alerts older than the snapshot also go.
+    """
+    cutoff = datetime.now(timezone.utc)
+    stale_filter = {"status": {"$in": ["active", "ringing", "on_hold", "wrapping_up"]}}
+    stale_ids = [
+        call["call_id"]
+        for call in await db.calls.find(stale_filter, {"_id": 0, "call_id": 1}).to_list(None)
+        if partition is None or partition(call["call_id"])
+    ]
+    for i in range(0, len(stale_ids), batch_size):
+        batch = stale_ids[i:i + batch_size]
+        await db[TRANSCRIPT_COLLECTION].delete_many({"call_id": {"$in": batch}})
+        await db.calls.delete_many({"call_id": {"$in": batch}})
+        await db.alerts.delete_many({"call_id": {"$in": batch}, "status": "active"})
+    if partition is None:
+        # $not/$gte rather than $lt so alerts with pre-migration string dates still match
+        await db.alerts.delete_many({"status": "active", "created_at": {"$not": {"$gte": cutoff}}})
+    if stale_ids:
+        logger.info(f"Removed {len(stale_ids)} stale calls")
+    return len(stale_ids)
+
+
 class SimulationEngine:
-    def __init__(self, db, broadcast_fn):
+    def __init__(self, db, broadcast_fn, metrics=None, summaries=None, shard=None, publish_metrics=True):
         self.db = db
         self.broadcast = broadcast_fn
+        self.metrics = metrics
+        self.summaries = summaries
+        # (index, count): only generate call_ids in this hash partition
+        self.shard = shard
+        self.publish_metrics = publish_metrics
         self.running = False
-        self.config = {
-            "num_calls": 12,
-            "issue_frequency": 0.3,
-            "sentiment_distribution": "normal",
-            "message_interval": 4,
-        }
+        self.config = dict(DEFAULT_CONFIG)
         self.active_calls = {}
         self.call_counter = 0
         self._task = None
+        self.writer = BulkWriter(db)
+        self._progress_slots = asyncio.Semaphore(MAX_CONCURRENT_PROGRESS)
 
     async def start(self):
         if self.running:
             return
         self.running = True
-        await self._seed_agents()
-        for _ in range(self.config["num_calls"]):
-            await self._create_call()
-            await asyncio.sleep(random.uniform(0.2, 0.5))
+        await self.writer.start()
+        try:
+            await self._seed_agents()
+        except Exception:
+            self.running = False
+            await self.writer.stop()
+            raise
+        # Initial calls are ramped up inside the loop task so start() returns immediately
         self._task = asyncio.create_task(self._run_loop())
-        logger.info(f"Simulation started with {self.config['num_calls']} calls")
+        logger.info(f"Simulation started, ramping up to {self.config['num_calls']} calls")
 
     async def stop(self):
         self.running = False
         if self._task:
             self._task.cancel()
             self._task = None
+        await self.writer.stop()
         logger.info("Simulation stopped")
 
     async def update_config(self, new_config):
@@ -300,11 +376,12 @@ class SimulationEngine:
         return False
 
     async def _seed_agents(self):
+        existing = set(await self.db.agents.distinct("agent_id"))
+        missing = []
         for agent in AGENT_PROFILES:
-            existing = await self.db.agents.find_one({"agent_id": agent["agent_id"]}, {"_id": 0})
-            if not existing:
-                now = datetime.now(timezone.utc).isoformat()
-                await self.db.agents.insert_one({
+            if agent["agent_id"] not in existing:
+                now = datetime.now(timezone.utc)
+                missing.append({
                     "agent_id": agent["agent_id"],
                     "name": agent["name"],
                     "skills": agent["skills"],
@@ -326,17 +403,41 @@ class SimulationEngine:
                         "quality_score": round(random.uniform(70, 98), 1),
                     }
                 })
+        if missing:
+            try:
+                await self.db.agents.insert_many(missing, ordered=False)
+            except BulkWriteError as e:
+                # Another process (e.g. a sibling shard) seeded some of them first
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+
+    async def _ramp_up(self):
+        """Stagger the initial calls so they don't all progress in lockstep."""
+        # Large load-test populations ramp over about the same few seconds as the default 12 calls
+        stagger = min(1.0, DEFAULT_CONFIG["num_calls"] / max(1, self.config["num_calls"]))
+        for _ in range(self.config["num_calls"] - len(self.active_calls)):
+            if not self.running:
+                return
+            await self._create_call_isolated()
+            await asyncio.sleep(random.uniform(0.2, 0.5) * stagger)
+
+    def _new_call_id(self):
+        while True:
+            call_id = f"CALL-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+            if self.shard is None or shard_of(call_id, self.shard[1]) == self.shard[0]:
+                return call_id
 
     async def _create_call(self, scenario=None):
         self.call_counter += 1
-        call_id = f"CALL-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+        call_id = self._new_call_id()
 
         if scenario is None:
             scenario = random.choice(SCENARIOS)
 
         agent_profile = random.choice(AGENT_PROFILES)
         customer_name = random.choice(CUSTOMER_NAMES)
-        now = datetime.now(timezone.utc).isoformat()
+        now = datetime.now(timezone.utc)
+        sentiment_stats = new_sentiment_stats()
 
         call_doc = {
             "call_id": call_id,
@@ -359,7 +460,7 @@ class SimulationEngine:
                 "name": agent_profile["name"],
                 "skills": agent_profile["skills"],
             },
-            "transcript": [],
+            "transcript_tail": None,
             "ai_summary": {
                 "overall_sentiment": 0.0,
                 "sentiment_trend": "stable",
@@ -370,6 +471,7 @@ class SimulationEngine:
                 "recommended_actions": [],
             },
             "health_score": 80,
+            "sentiment_stats": sentiment_stats_doc(sentiment_stats),
             "alerts_triggered": [],
             "supervisor_actions": [],
             "resolution": None,
@@ -380,10 +482,12 @@ class SimulationEngine:
         }
 
         result = await self.db.calls.insert_one(call_doc)
-        await self.db.agents.update_one(
+        self.writer.update_one(
+            "agents",
             {"agent_id": agent_profile["agent_id"]},
             {"$set": {"status": "on_call", "current_call_id": call_id}}
         )
+        self.writer.update_one(ROLLUP_COLLECTION, *call_started_update(now, call_doc["ai_summary"]["primary_issue"]), upsert=True)
 
         self.active_calls[call_id] = {
             "scenario": scenario,
@@ -392,6 +496,15 @@ class SimulationEngine:
             "customer_name": customer_name,
             "started_at": datetime.now(timezone.utc),
             "agent_id": agent_profile["agent_id"],
+            "issue": call_doc["ai_summary"]["primary_issue"],
+            "sentiment": sentiment_stats,
+            "summary": FallbackSummarizer(),
+            # speaker/text of each utterance, handed to the LLM summary queue at call end
+            "lines": [],
+            "tail": None,
+            "health": call_doc["health_score"],
+            "seq": 0,
+            "alert_count": 0,
         }
 
         # Exclude MongoDB _id and internal fields from broadcast
@@ -417,9 +530,12 @@ class SimulationEngine:
         now = datetime.now(timezone.utc)
         duration = int((now - call_state["started_at"]).total_seconds())
 
-        call_doc = await self.db.calls.find_one({"call_id": call_id}, {"_id": 0})
-        transcript = call_doc.get("transcript", []) if call_doc else []
-        summary = generate_fallback_summary(transcript)
+        # Finalized purely from in-memory state: no read, one write. Buffered
+        # progress updates are filtered on status "active" and become no-ops
+        # once this lands, so it also carries the latest progress fields.
+        summary = call_state["summary"].summary()
+        # The fallback can't classify the issue; keep the scenario's until the LLM names one
+        summary["primary_issue"] = call_state["issue"]
 
         resolution_type = random.choice(["solved", "escalated", "callback_scheduled"])
         satisfaction = random.randint(1, 5) if resolution_type == "solved" else random.randint(1, 3)
@@ -428,8 +544,11 @@ class SimulationEngine:
             {"call_id": call_id},
             {"$set": {
                 "status": "ended",
-                "ended_at": now.isoformat(),
+                "ended_at": now,
                 "duration_seconds": duration,
+                "transcript_tail": call_state["tail"],
+                "health_score": call_state["health"],
+                "sentiment_stats": sentiment_stats_doc(call_state["sentiment"]),
                 "ai_summary": summary,
                 "resolution": {
                     "resolved": resolution_type == "solved",
@@ -438,93 +557,148 @@ class SimulationEngine:
                 }
             }}
         )
-        await self.db.agents.update_one(
+        # The fallback summary is stored now; the LLM one replaces it in the background
+        if self.summaries is not None:
+            self.summaries.enqueue(call_id, call_state["lines"])
+        self.writer.update_one(
+            "agents",
             {"agent_id": call_state["agent_id"]},
             {"$set": {"status": "available", "current_call_id": None}}
         )
+        self.writer.update_one(ROLLUP_COLLECTION, *call_ended_update(
+            call_state["started_at"], summary["overall_sentiment"], call_state["agent_id"], call_state["alert_count"],
+        ), upsert=True)
 
-        await self.broadcast({"type": "call_ended", "data": {"call_id": call_id, "duration": duration}})
+        await self.broadcast({"type": "call_ended", "data": {
+            "call_id": call_id,
+            "agent_id": call_state["agent_id"],
+            "duration": duration,
+            "ended_at": now,
+            "overall_sentiment": summary["overall_sentiment"],
+            "resolved": resolution_type == "solved",
+        }})
 
     async def _run_loop(self):
         logger.info("Simulation loop starting...")
+        loop = asyncio.get_running_loop()
         try:
+            await self._ramp_up()
+            next_tick = loop.time()
             while self.running:
                 call_ids = list(self.active_calls.keys())
-                for call_id in call_ids:
-                    if not self.running:
-                        break
-                    try:
-                        await self._progress_call(call_id)
-                    except Exception as e:
-                        logger.error(f"Error progressing call {call_id}: {e}", exc_info=True)
+                analyses = self._analyze_next_messages(call_ids)
+                await asyncio.gather(*(
+                    self._progress_call_isolated(call_id, analyses.get(call_id)) for call_id in call_ids
+                ))
 
                 # Replace ended calls
-                while len(self.active_calls) < self.config["num_calls"] and self.running:
+                missing = self.config["num_calls"] - len(self.active_calls)
+                if missing > 0 and self.running:
+                    await asyncio.gather(*(self._create_call_isolated() for _ in range(missing)))
+
+                # Broadcast metrics (sharded workers leave this to the API processes)
+                if self.publish_metrics:
                     try:
-                        await self._create_call()
+                        await self._broadcast_metrics()
                     except Exception as e:
-                        logger.error(f"Error creating call: {e}", exc_info=True)
-                    await asyncio.sleep(0.3)
-
-                # Broadcast metrics
-                try:
-                    await self._broadcast_metrics()
-                except Exception as e:
-                    logger.error(f"Error broadcasting metrics: {e}")
-                await asyncio.sleep(self.config.get("message_interval", 4))
+                        logger.error(f"Error broadcasting metrics: {e}")
+
+                # Fixed-rate schedule: subtract this tick's processing time
+                next_tick += self.config.get("message_interval", 4)
+                delay = next_tick - loop.time()
+                if delay < 0:
+                    logger.warning(f"Simulation tick overran by {-delay:.2f}s")
+                    next_tick = loop.time()
+                    delay = 0
+                await asyncio.sleep(delay)
         except asyncio.CancelledError:
             logger.info("Simulation loop cancelled")
         except Exception as e:
             logger.error(f"Simulation loop fatal error: {e}", exc_info=True)
 
-    async def _progress_call(self, call_id):
+    def _next_message(self, state):
+        messages = state["scenario"]["messages"]
+        idx = state["message_index"]
+        if idx >= len(messages):
+            return None
+        msg_template = messages[idx]
+        text = msg_template["text"].replace("{agent}", state["agent_name"]).replace("{customer}", state["customer_name"])
+        return text, msg_template["speaker"]
+
+    def _analyze_next_messages(self, call_ids):
+        """Analyze the upcoming utterance of every call in one batch."""
+        pending = {}
+        for call_id in call_ids:
+            message = self._next_message(self.active_calls[call_id])
+            if message:
+                pending[call_id] = message
+        analyses = analyze_messages(pending.values())
+        return dict(zip(pending, analyses))
+
+    async def _create_call_isolated(self):
+        async with self._progress_slots:
+            try:
+                await self._create_call()
+            except Exception as e:
+                logger.error(f"Error creating call: {e}", exc_info=True)
+
+    async def _progress_call_isolated(self, call_id, analysis=None):
+        async with self._progress_slots:
+            if not self.running:
+                return
+            try:
+                await self._progress_call(call_id, analysis)
+            except Exception as e:
+                logger.error(f"Error progressing call {call_id}: {e}", exc_info=True)
+
+    async def _progress_call(self, call_id, analysis=None):
         if call_id not in self.active_calls:
             return
         state = self.active_calls[call_id]
-        scenario = state["scenario"]
-        messages = scenario["messages"]
         idx = state["message_index"]
+        message = self._next_message(state)
 
-        if idx >= len(messages):
+        if message is None:
             await self._end_call(call_id)
             return
 
-        msg_template = messages[idx]
-        text = msg_template["text"].replace("{agent}", state["agent_name"]).replace("{customer}", state["customer_name"])
-        speaker = msg_template["speaker"]
-
-        analysis = analyze_message(text, speaker)
+        text, speaker = message
+        if analysis is None:
+            analysis = analyze_message(text, speaker)
         now = datetime.now(timezone.utc)
 
         transcript_entry = {
             "speaker": speaker,
             "text": text,
-            "timestamp": now.isoformat(),
+            "timestamp": now,
             "analysis": analysis,
         }
 
         duration = int((now - state["started_at"]).total_seconds())
-        sentiments = []
-        call_doc = await self.db.calls.find_one({"call_id": call_id}, {"_id": 0, "transcript": 1})
-        if call_doc and call_doc.get("transcript"):
-            sentiments = [m["analysis"]["sentiment"] for m in call_doc["transcript"] if m.get("analysis")]
-        sentiments.append(analysis["sentiment"])
-        avg_sentiment = sum(sentiments) / len(sentiments) if sentiments else 0
+        avg_sentiment = update_sentiment_stats(state["sentiment"], analysis["sentiment"])
+        state["summary"].add(transcript_entry)
+        state["lines"].append({"speaker": speaker, "text": text})
+        state["tail"] = transcript_entry
         health = max(0, min(100, int(50 + avg_sentiment * 50)))
+        state["health"] = health
 
-        await self.db.calls.update_one(
+        self.writer.insert_one(TRANSCRIPT_COLLECTION, transcript_doc(call_id, idx, transcript_entry))
+        self.writer.update_one(
+            "calls",
             {"call_id": call_id, "status": "active"},
             {
-                "$push": {"transcript": transcript_entry},
                 "$set": {
+                    "transcript_tail": transcript_entry,
                     "duration_seconds": duration,
                     "health_score": health,
                     "ai_summary.overall_sentiment": round(avg_sentiment, 2),
+                    "sentiment_stats": sentiment_stats_doc(state["sentiment"]),
                 }
             }
         )
 
         state["message_index"] = idx + 1
+        state["seq"] += 1
 
         # Check for alerts
         for flag in analysis.get("flags", []):
@@ -534,6 +708,8 @@ class SimulationEngine:
             "type": "call_update",
             "data": {
                 "call_id": call_id,
+                "agent_id": state["agent_id"],
+                "seq": state["seq"],
                 "transcript_entry": transcript_entry,
                 "health_score": health,
                 "avg_sentiment": round(avg_sentiment, 2),
@@ -549,6 +725,7 @@ class SimulationEngine:
             "profanity": ("Profanity Detected", "warning", "agent_issue"),
         }
         title, severity, alert_type = alert_map.get(flag_type, ("Issue Detected", "info", "agent_issue"))
+        state["alert_count"] += 1
 
         alert_doc = {
             "alert_id": f"ALT-{uuid.uuid4().hex[:8]}",
@@ -562,14 +739,15 @@ class SimulationEngine:
                 "sentiment_score": sentiment,
                 "context": f"Customer: {state['customer_name']}, Agent: {state['agent_name']}",
             },
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "status": "active",
             "acknowledged_by": None,
             "acknowledged_at": None,
             "resolution_notes": None,
         }
-        await self.db.alerts.insert_one(alert_doc)
-        await self.db.calls.update_one(
+        self.writer.insert_one("alerts", alert_doc)
+        self.writer.update_one(
+            "calls",
             {"call_id": call_id},
             {"$push": {"alerts_triggered": {
                 "alert_type": alert_type,
@@ -585,6 +763,10 @@ class SimulationEngine:
     async def _broadcast_metrics(self):
         active_count = len(self.active_calls)
 
+        if self.metrics:
+            await self.broadcast(self.metrics.metrics_update(active_calls=active_count))
+            return
+
         # Use aggregation instead of fetching all documents
         pipeline = [
             {"$match": {"status": "active"}},
@@ -599,12 +781,6 @@ class SimulationEngine:
 
         active_alerts = await self.db.alerts.count_documents({"status": "active"})
 
-        await self.broadcast({
-            "type": "metrics_update",
-            "data": {
-                "active_calls": active_count,
-                "avg_sentiment": round(data.get("avg_sentiment") or 0, 2),
-                "alerts_count": active_alerts,
-                "longest_call": data.get("max_duration") or 0,
-            }
-        })
+        await self.broadcast(metrics_update_message(
+            active_count, round(data.get("avg_sentiment") or 0, 2), active_alerts, data.get("max_duration") or 0,
+        ))
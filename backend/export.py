@@ -0,0 +1,188 @@
+"""Streaming call exports.
+
+Ended calls are read from a Mongo cursor in batches and encoded as they
+arrive, so memory stays flat however many calls the range covers:
+
+    ndjson   one full call document per line
+    csv      one row per call, EXPORT_COLUMNS
+    parquet  EXPORT_COLUMNS, one row group per batch (needs pyarrow)
+"""
+import csv
+import importlib.util
+import io
+import json
+import zlib
+
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_PROJECTION = {
+    "_id": 0, "transcript": 0, "transcript_tail": 0, "sentiment_stats": 0,
+    "_scenario": 0, "_message_index": 0, "_last_message_time": 0, "_created_at": 0,
+}
+
+# (column, dotted path into the call document, arrow type name)
+EXPORT_COLUMNS = [
+    ("call_id", "call_id", "string"),
+    ("status", "status", "string"),
+    ("channel", "channel", "string"),
+    ("started_at", "started_at", "timestamp"),
+    ("ended_at", "ended_at", "timestamp"),
+    ("duration_seconds", "duration_seconds", "int64"),
+    ("agent_id", "agent.id", "string"),
+    ("agent_name", "agent.name", "string"),
+    ("customer_id", "customer.id", "string"),
+    ("customer_name", "customer.name", "string"),
+    ("account_type", "customer.account_type", "string"),
+    ("health_score", "health_score", "int64"),
+    ("overall_sentiment", "ai_summary.overall_sentiment", "float64"),
+    ("sentiment_trend", "ai_summary.sentiment_trend", "string"),
+    ("primary_issue", "ai_summary.primary_issue", "string"),
+    ("risk_level", "ai_summary.risk_level", "string"),
+    ("churn_probability", "ai_summary.churn_probability", "float64"),
+    ("alert_count", "alerts_triggered", "int64"),
+    ("resolved", "resolution.resolved", "bool"),
+    ("resolution_type", "resolution.resolution_type", "string"),
+    ("customer_satisfaction", "resolution.customer_satisfaction", "int64"),
+]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def available_formats():
+    # find_spec checks pyarrow is installed without paying for importing it
+    return [fmt for fmt in MEDIA_TYPES if fmt != "parquet" or importlib.util.find_spec("pyarrow") is not None]
+
+
+def export_query(start=None, end=None, agent_id=None):
+    query = {"status": "ended"}
+    if start or end:
+        query["ended_at"] = {}
+        if start:
+            query["ended_at"]["$gte"] = start
+        if end:
+            query["ended_at"]["$lt"] = end
+    if agent_id:
+        query["agent.id"] = agent_id
+    return query
+
+
+def _lookup(doc, path):
+    value = doc
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def flatten(call):
+    row = {}
+    for column, path, _ in EXPORT_COLUMNS:
+        value = _lookup(call, path)
+        row[column] = len(value or []) if path == "alerts_triggered" else value
+    return row
+
+
+def _default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+async def _batches(cursor, batch_size):
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stream_ndjson(cursor, batch_size=EXPORT_BATCH_SIZE):
+    async for batch in _batches(cursor, batch_size):
+        yield "".join(json.dumps(call, default=_default) + "\n" for call in batch).encode()
+
+
+async def stream_csv(cursor, batch_size=EXPORT_BATCH_SIZE):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=[column for column, _, _ in EXPORT_COLUMNS])
+    writer.writeheader()
+    async for batch in _batches(cursor, batch_size):
+        for call in batch:
+            row = flatten(call)
+            writer.writerow({k: _default(v) if hasattr(v, "isoformat") else v for k, v in row.items()})
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the generator on drain()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_schema(pa):
+    types = {
+        "string": pa.string(),
+        "timestamp": pa.timestamp("ms", tz="UTC"),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+    }
+    return pa.schema([(column, types[kind]) for column, _, kind in EXPORT_COLUMNS])
+
+
+async def stream_parquet(cursor, batch_size=EXPORT_BATCH_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("pyarrow is required for parquet exports")
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        async for batch in _batches(cursor, batch_size):
+            writer.write_table(pa.Table.from_pylist([flatten(call) for call in batch], schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    "ndjson": stream_ndjson,
+    "csv": stream_csv,
+    "parquet": stream_parquet,
+}
+
+
+async def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
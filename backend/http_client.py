@@ -0,0 +1,67 @@
+import asyncio
+import importlib.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+class SharedHttpClient:
+    """Application-lifetime httpx client: pooled keep-alive connections, HTTP/2
+    when the h2 package is installed, explicit timeouts, a cap on in-flight
+    requests and limited retries on connection errors and gateway failures.
+
+    httpx is imported and the pool is built on first request. Pass `transport`
+    (e.g. httpx.MockTransport) to run against a stub instead of the network.
+    """
+
+    def __init__(self, timeout=10.0, connect_timeout=3.0, max_connections=100,
+                 max_keepalive=20, max_in_flight=50, retries=2, backoff=0.2, transport=None):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_keepalive),
+                http2=importlib.util.find_spec("h2") is not None,
+                transport=self.transport,
+            )
+        return self._client
+
+    async def request(self, method, url, **kwargs):
+        import httpx
+
+        client = self._get_client()
+        async with self._slots:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        return response
+                    logger.warning(f"{method} {url} returned {response.status_code}, retrying")
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
+                    if attempt == self.retries:
+                        raise
+                    logger.warning(f"{method} {url} failed ({type(e).__name__}), retrying")
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,298 @@
+"""Declared index set, reconciled at startup.
+
+INDEXES is the full set of indexes per collection; ensure_indexes() creates
+missing ones, replaces ones whose options changed and drops undeclared ones
+last. A change that only makes an index unique or TTL is applied in place
+with collMod (MongoDB 6.0+). Otherwise the replacement is built before the
+old index is dropped, except where Mongo can't hold both (same name, or
+conflicting options on the same keys): then the old index is dropped right
+before the build and recreated if the build fails.
+At startup, reconcile_if_changed() skips all of that when the declared set's
+fingerprint matches the one recorded by the last successful reconcile.
+Audit that every hot query shape is served by an index with:
+
+    python indexes.py --explain
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+from analytics_rollup import ROLLUP_COLLECTION
+from mongo_cli import cli_db
+from pagination import encode_cursor, keyset_filter
+from transcripts import TRANSCRIPT_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "calls": [
+        IndexModel([("call_id", 1)], unique=True),
+        # /calls/active, simulator and metrics reads of live calls
+        IndexModel([("status", 1), ("started_at", -1)]),
+        # /calls/history and /analytics/export: status=ended sorted by ended_at
+        IndexModel([("status", 1), ("ended_at", -1), ("call_id", -1)]),
+        # /agents/{id}/calls
+        IndexModel([("agent.id", 1), ("started_at", -1), ("call_id", -1)]),
+        # started_at range scans: today's totals and issue grouping in rollup backfills
+        IndexModel([("started_at", -1), ("status", 1), ("ai_summary.primary_issue", 1)]),
+    ],
+    "alerts": [
+        IndexModel([("alert_id", 1)], unique=True),
+        # status=active without a created_at sort: LiveMetrics.reconcile, stale cleanup
+        IndexModel([("status", 1)]),
+        # /alerts only ever touches the few active alerts
+        IndexModel([("created_at", -1)], name="active_created_at",
+                   partialFilterExpression={"status": "active"}),
+        # /alerts/history
+        IndexModel([("created_at", -1), ("alert_id", -1)]),
+    ],
+    "agents": [
+        IndexModel([("agent_id", 1)], unique=True),
+    ],
+    "users": [
+        IndexModel([("user_id", 1)], unique=True),
+        IndexModel([("email", 1)], unique=True),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", 1)], unique=True),
+        # Mongo's TTL monitor removes sessions once expires_at has passed
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+    ],
+    ROLLUP_COLLECTION: [
+        IndexModel([("date", 1)]),
+    ],
+    TRANSCRIPT_COLLECTION: [
+        IndexModel([("call_id", 1), ("seq", 1)], unique=True),
+    ],
+}
+
+INDEX_META_COLLECTION = "schema_meta"
+
+# Options that change what an index does; anything else (v, ns, background) is ignored
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+# Mongo error codes for an index that can't coexist with an existing one
+INDEX_CONFLICT_CODES = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+
+
+def _spec(info):
+    key = info["key"].items() if isinstance(info["key"], dict) else info["key"]
+    # `is not` rather than `in`: expireAfterSeconds=0 is a TTL index, not a missing option
+    options = tuple((opt, info[opt]) for opt in COMPARED_OPTIONS
+                    if info.get(opt) is not None and info.get(opt) is not False)
+    return tuple((field, int(direction)) for field, direction in key), options
+
+
+def _model_from_info(name, info):
+    options = {k: v for k, v in info.items() if k not in ("key", "v", "ns")}
+    return IndexModel(list(info["key"].items()) if isinstance(info["key"], dict) else info["key"], **{**options, "name": name})
+
+
+async def _has_duplicates(coll, keys):
+    group_id = {str(i): f"${field}" for i, (field, _) in enumerate(keys)}
+    pipeline = [
+        {"$group": {"_id": group_id, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+        {"$limit": 1},
+    ]
+    return bool(await coll.aggregate(pipeline, allowDiskUse=True).to_list(1))
+
+
+async def _convert_in_place(coll, name, old_options, new_options):
+    """collMod index `name` into a unique and/or TTL index without rebuilding it.
+
+    Returns False when the change is anything else; raises OperationFailure,
+    with the index unchanged, when existing duplicates block `unique`.
+    """
+    old, new = dict(old_options), dict(new_options)
+    old_ttl, ttl = old.pop("expireAfterSeconds", None), new.pop("expireAfterSeconds", None)
+    old_unique, unique = old.pop("unique", False), new.pop("unique", False)
+    if old != new or (old_unique and not unique) or (old_ttl is not None and ttl is None):
+        return False
+    command = coll.database.command
+    if unique and not old_unique:
+        # prepareUnique rejects new duplicates, so the conversion can't race inserts
+        await command("collMod", coll.name, index={"name": name, "prepareUnique": True})
+        try:
+            await command("collMod", coll.name, index={"name": name, "unique": True})
+        except OperationFailure:
+            await command("collMod", coll.name, index={"name": name, "prepareUnique": False})
+            raise
+    if ttl != old_ttl:
+        await command("collMod", coll.name, index={"name": name, "expireAfterSeconds": ttl})
+    return True
+
+
+async def ensure_indexes(db, indexes=INDEXES):
+    """Reconcile each collection's indexes with the declared set; returns {"created", "dropped", "failed"} lists."""
+    created, dropped, failed = [], [], []
+    for collection, models in indexes.items():
+        coll = db[collection]
+        existing = await coll.index_information()
+        existing.pop("_id_", None)
+        replaced = set()
+
+        for model in models:
+            name = model.document["name"]
+            spec = _spec(model.document)
+            if name in existing and _spec(existing[name]) == spec:
+                replaced.add(name)
+                continue
+            # The existing index this one replaces: same name or same key pattern
+            old = next((n for n, info in existing.items()
+                        if n not in replaced and (n == name or _spec(info)[0] == spec[0])), None)
+            label = f"{collection}.{name}"
+            if old:
+                replaced.add(old)
+
+            if old == name and _spec(existing[old])[0] == spec[0]:
+                try:
+                    if await _convert_in_place(coll, old, _spec(existing[old])[1], spec[1]):
+                        created.append(label)
+                        continue
+                except OperationFailure as e:
+                    logger.error(f"Could not convert index {label}: {e}; keeping the old one")
+                    failed.append(label)
+                    continue
+
+            if old != name:
+                # Build first; the old index keeps serving until the new one is ready
+                try:
+                    await coll.create_indexes([model])
+                    created.append(label)
+                    if old:
+                        await coll.drop_index(old)
+                        dropped.append(f"{collection}.{old}")
+                    continue
+                except OperationFailure as e:
+                    if not old or e.code not in INDEX_CONFLICT_CODES:
+                        logger.error(f"Could not build index {label}: {e}")
+                        failed.append(label)
+                        continue
+
+            # Mongo can't hold both, so the old index has to go first
+            if model.document.get("unique") and await _has_duplicates(coll, spec[0]):
+                logger.error(f"Could not build index {label}: duplicate values; keeping {old}")
+                failed.append(label)
+                continue
+            await coll.drop_index(old)
+            try:
+                await coll.create_indexes([model])
+                created.append(label)
+                dropped.append(f"{collection}.{old}")
+            except Exception as e:
+                logger.error(f"Could not build index {label}: {e}; restoring {old}")
+                failed.append(label)
+                await coll.create_indexes([_model_from_info(old, existing[old])])
+
+        # Undeclared indexes go last, once everything declared is in place
+        for name in existing.keys() - replaced:
+            await coll.drop_index(name)
+            dropped.append(f"{collection}.{name}")
+    if created or dropped:
+        logger.info(f"Indexes reconciled: created {created}, dropped {dropped}")
+    return {"created": created, "dropped": dropped, "failed": failed}
+
+
+def index_fingerprint(indexes=INDEXES):
+    declared = {collection: sorted(json.dumps(model.document, sort_keys=True, default=str) for model in models)
+                for collection, models in indexes.items()}
+    return hashlib.sha256(json.dumps(declared, sort_keys=True).encode()).hexdigest()
+
+
+async def reconcile_if_changed(db, indexes=INDEXES):
+    """ensure_indexes() unless this declared set was already reconciled; returns None when skipped."""
+    fingerprint = index_fingerprint(indexes)
+    meta = await db[INDEX_META_COLLECTION].find_one({"_id": "indexes"})
+    if meta and meta.get("fingerprint") == fingerprint:
+        return None
+    result = await ensure_indexes(db, indexes)
+    if not result["failed"]:
+        await db[INDEX_META_COLLECTION].update_one(
+            {"_id": "indexes"}, {"$set": {"fingerprint": fingerprint}}, upsert=True
+        )
+    return result
+
+
+def _today():
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _page_cursor(tie_value):
+    return encode_cursor(_today(), tie_value)
+
+
+# (collection, filter, sort) of every hot query the API and simulator issue,
+# including the keyset page-2+ shapes (see server.with_cursor)
+QUERY_SHAPES = [
+    ("calls", {"call_id": "CALL-0"}, None),
+    ("calls", {"status": {"$in": ["active", "ringing", "on_hold", "wrapping_up"]}}, [("started_at", -1)]),
+    ("calls", {"status": "ended"}, [("ended_at", -1), ("call_id", -1)]),
+    ("calls", {"status": "ended", **keyset_filter(_page_cursor("CALL-0"), "ended_at", "call_id")},
+     [("ended_at", -1), ("call_id", -1)]),
+    ("calls", {"agent.id": "AGT-001"}, [("started_at", -1), ("call_id", -1)]),
+    ("calls", {"agent.id": "AGT-001", **keyset_filter(_page_cursor("CALL-0"), "started_at", "call_id")},
+     [("started_at", -1), ("call_id", -1)]),
+    ("calls", {"started_at": {"$gte": _today()}}, None),
+    ("alerts", {"alert_id": "ALT-0"}, None),
+    ("alerts", {"status": "active"}, [("created_at", -1)]),
+    ("alerts", {"status": "active"}, None),
+    ("alerts", {}, [("created_at", -1), ("alert_id", -1)]),
+    ("alerts", keyset_filter(_page_cursor("ALT-0"), "created_at", "alert_id"), [("created_at", -1), ("alert_id", -1)]),
+    ("agents", {"agent_id": "AGT-001"}, None),
+    ("users", {"email": "user@example.com"}, None),
+    ("user_sessions", {"session_token": "st_0"}, None),
+    (TRANSCRIPT_COLLECTION, {"call_id": "CALL-0", "seq": {"$gte": 0}}, [("seq", 1)]),
+]
+
+
+def _stages(plan):
+    stages = [plan.get("stage")]
+    for child in plan.get("inputStages", []) + ([plan["inputStage"]] if "inputStage" in plan else []):
+        stages.extend(_stages(child))
+    return stages
+
+
+async def explain(db, shapes=QUERY_SHAPES):
+    """[(collection, filter, sort, stages of the winning plan, uses an index)] per query shape."""
+    results = []
+    for collection, query, sort in shapes:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        plan = plan.get("queryPlan", plan)  # slot-based engine nests the classic plan
+        stages = _stages(plan)
+        # A blocking in-memory SORT means the index doesn't provide the order
+        results.append((collection, query, sort, stages, "IXSCAN" in stages and not {"COLLSCAN", "SORT"} & set(stages)))
+    return results
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Reconcile MongoDB indexes with the declared set")
+    parser.add_argument("--explain", action="store_true", help="also report the winning plan of each hot query")
+    args = parser.parse_args()
+
+    async with cli_db() as db:
+        result = await ensure_indexes(db)
+        if not result["failed"]:
+            await db[INDEX_META_COLLECTION].update_one(
+                {"_id": "indexes"}, {"$set": {"fingerprint": index_fingerprint()}}, upsert=True
+            )
+        print(f"Created {len(result['created'])} indexes, dropped {len(result['dropped'])}, "
+              f"failed {len(result['failed'])}")
+        if args.explain:
+            missed = 0
+            for collection, query, sort, stages, indexed in await explain(db):
+                missed += not indexed
+                print(f"{'IXSCAN' if indexed else 'MISSED'}  {collection} {query} sort={sort}: {' <- '.join(stages)}")
+            raise SystemExit(1 if missed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from mongo_cli import as_datetime
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ["active", "ringing", "on_hold"]
+
+
+def metrics_update_message(active_calls, avg_sentiment, alerts_count, longest_call):
+    """The periodic metrics_update broadcast behind the dashboard's KPI bar."""
+    return {
+        "type": "metrics_update",
+        "data": {
+            "active_calls": active_calls,
+            "avg_sentiment": avg_sentiment,
+            "alerts_count": alerts_count,
+            "longest_call": longest_call,
+        }
+    }
+
+
+def _today_start():
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class LiveMetrics:
+    """Real-time KPIs maintained from the same events that are broadcast to clients.
+
+    call_started / call_update / call_ended and alert events adjust running
+    sums and counters, so reading the KPIs is O(1). reconcile() periodically
+    rebuilds the state from Mongo to correct any drift; events that arrive
+    while its queries run are replayed onto the rebuilt state.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.calls = {}
+        self.sentiment_sum = 0.0
+        self.health_sum = 0
+        self.max_duration = 0
+        self.active_alerts = set()
+        self.day = _today_start()
+        self.total_today = 0
+        self.ended_today = 0
+        self._replay = None
+        self._task = None
+
+    # ─── Event handling ───
+    def observe(self, message: dict):
+        handler = self._handlers.get(message.get("type"))
+        data = message.get("data")
+        if handler and isinstance(data, dict):
+            self._roll_day()
+            handler(self, data)
+            if self._replay is not None:
+                self._replay.append((handler, data))
+
+    def _on_call_started(self, data):
+        call_id = data["call_id"]
+        if call_id in self.calls:
+            return
+        started_at = as_datetime(data.get("started_at")) or datetime.now(timezone.utc)
+        self._track(call_id, {
+            "sentiment": (data.get("ai_summary") or {}).get("overall_sentiment") or 0.0,
+            "health": data.get("health_score") or 0,
+            "duration": data.get("duration_seconds") or 0,
+            "started_at": started_at,
+        })
+        if started_at >= self.day:
+            self.total_today += 1
+
+    def _on_call_update(self, data):
+        call = self.calls.get(data["call_id"])
+        if call is None:
+            # Not seen yet (e.g. dropped by a reconcile racing buffered writes)
+            self._track(data["call_id"], {"sentiment": 0.0, "health": 0, "duration": 0, "started_at": self.day})
+            call = self.calls[data["call_id"]]
+        if "avg_sentiment" in data:
+            self.sentiment_sum += data["avg_sentiment"] - call["sentiment"]
+            call["sentiment"] = data["avg_sentiment"]
+        if "health_score" in data:
+            self.health_sum += data["health_score"] - call["health"]
+            call["health"] = data["health_score"]
+        if "duration_seconds" in data:
+            call["duration"] = data["duration_seconds"]
+            self.max_duration = max(self.max_duration, call["duration"])
+
+    def _on_call_ended(self, data):
+        call = self.calls.pop(data["call_id"], None)
+        if call is None:
+            return
+        self.sentiment_sum -= call["sentiment"]
+        self.health_sum -= call["health"]
+        if call["duration"] >= self.max_duration:
+            self.max_duration = max((c["duration"] for c in self.calls.values()), default=0)
+        if call["started_at"] >= self.day:
+            self.ended_today += 1
+
+    def _on_alert_new(self, data):
+        if data.get("status", "active") == "active" and data.get("alert_id"):
+            self.active_alerts.add(data["alert_id"])
+
+    def _on_alert_closed(self, data):
+        self.active_alerts.discard(data.get("alert_id"))
+
+    _handlers = {
+        "call_started": _on_call_started,
+        "call_update": _on_call_update,
+        "call_ended": _on_call_ended,
+        "alert_new": _on_alert_new,
+        "alert_acknowledged": _on_alert_closed,
+        "alert_resolved": _on_alert_closed,
+    }
+
+    def _track(self, call_id, call):
+        self.calls[call_id] = call
+        self.sentiment_sum += call["sentiment"]
+        self.health_sum += call["health"]
+        self.max_duration = max(self.max_duration, call["duration"])
+
+    def _roll_day(self):
+        today = _today_start()
+        if today != self.day:
+            self.day = today
+            self.total_today = len(self.calls)
+            self.ended_today = 0
+
+    # ─── Reads ───
+    def snapshot(self):
+        self._roll_day()
+        count = len(self.calls)
+        return {
+            "active_calls": count,
+            "avg_sentiment": round(self.sentiment_sum / count, 2) if count else 0,
+            "alerts_count": len(self.active_alerts),
+            "longest_call": self.max_duration,
+            "total_calls_today": self.total_today,
+            "resolved_today": self.ended_today,
+            "avg_health_score": round(self.health_sum / count, 1) if count else 50,
+        }
+
+    def metrics_update(self, active_calls=None):
+        """metrics_update message from the current KPIs; `active_calls` overrides the tracked count."""
+        live = self.snapshot()
+        return metrics_update_message(
+            live["active_calls"] if active_calls is None else active_calls,
+            live["avg_sentiment"], live["alerts_count"], live["longest_call"],
+        )
+
+    # ─── Reconciliation ───
+    async def reconcile(self):
+        """Rebuild the state from Mongo."""
+        today = _today_start()
+        self._replay = []
+        try:
+            # Counts before the live-call read: a call that ends in between is then
+            # neither counted as ended nor seen active, rather than counted twice
+            today_pipeline = [
+                {"$match": {"started_at": {"$gte": today}}},
+                {"$facet": {
+                    "total": [{"$count": "n"}],
+                    "ended": [{"$match": {"status": "ended"}}, {"$count": "n"}],
+                }}
+            ]
+            today_result = await self.db.calls.aggregate(today_pipeline).to_list(1)
+            today_data = today_result[0] if today_result else {"total": [], "ended": []}
+            calls = await self.db.calls.find(
+                {"status": {"$in": ACTIVE_STATUSES}},
+                {"_id": 0, "call_id": 1, "started_at": 1, "duration_seconds": 1,
+                 "health_score": 1, "ai_summary.overall_sentiment": 1}
+            ).to_list(None)
+            alerts = await self.db.alerts.find({"status": "active"}, {"_id": 0, "alert_id": 1}).to_list(None)
+        finally:
+            replay, self._replay = self._replay, None
+
+        # No awaits from here on: the swap and the replay happen as one step
+        self.calls, self.sentiment_sum, self.health_sum, self.max_duration = {}, 0.0, 0, 0
+        for call in calls:
+            self._track(call["call_id"], {
+                "sentiment": (call.get("ai_summary") or {}).get("overall_sentiment") or 0.0,
+                "health": call.get("health_score") or 0,
+                "duration": call.get("duration_seconds") or 0,
+                "started_at": as_datetime(call.get("started_at")) or today,
+            })
+        self.day = today
+        self.total_today = today_data["total"][0]["n"] if today_data["total"] else 0
+        self.ended_today = today_data["ended"][0]["n"] if today_data["ended"] else 0
+        self.active_alerts = {a["alert_id"] for a in alerts}
+        # The queries may have missed events handled while they ran; the handlers
+        # are idempotent against state that already reflects them
+        for handler, data in replay:
+            handler(self, data)
+
+    async def start(self, interval=60):
+        if not self._task:
+            self._task = asyncio.create_task(self._reconcile_loop(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _reconcile_loop(self, interval):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Metrics reconciliation failed: {e}", exc_info=True)
+            await asyncio.sleep(interval)
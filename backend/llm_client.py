@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from collections import deque
+
+SYSTEM_MESSAGE = "You are a contact center AI analyst. Return ONLY valid JSON, no markdown."
+SUMMARY_SCHEMA = (
+    '{"overall_sentiment": <float -1 to 1>, "sentiment_trend": "<improving|stable|declining>", '
+    '"primary_issue": "<brief>", "topics_discussed": ["<t1>","<t2>"], "risk_level": "<low|medium|high|critical>", '
+    '"churn_probability": <float 0-1>, "recommended_actions": ["<a1>","<a2>"]}'
+)
+# Lines kept from the start of a long call: the customer usually states the issue there
+HEAD_LINES = 2
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token); no tokenizer dependency."""
+    return len(text) // 4 + 1
+
+
+def _line(message):
+    return f"{'Customer' if message.get('speaker') == 'customer' else 'Agent'}: {message.get('text', '')}"
+
+
+def fit_transcript(messages, budget):
+    """Transcript text within `budget` tokens: the opening lines, then as many
+    of the latest lines as fit, with a marker where lines were left out."""
+    lines = [_line(m) for m in messages]
+    if sum(estimate_tokens(line) for line in lines) <= budget:
+        return "\n".join(lines)
+    head = lines[:HEAD_LINES]
+    remaining = budget - sum(estimate_tokens(line) for line in head) - 10
+    if remaining < 0:
+        # Even the opening lines don't fit; fall back to a hard character cut
+        return "\n".join(lines)[-budget * 4:]
+    tail = []
+    for line in reversed(lines[HEAD_LINES:]):
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            break
+        tail.append(line)
+        remaining -= cost
+    tail.reverse()
+    omitted = len(lines) - len(head) - len(tail)
+    return "\n".join(head + [f"[... {omitted} lines omitted ...]"] + tail)
+
+
+def parse_json_response(response):
+    cleaned = response.strip()
+    if cleaned.startswith("```"):
+        cleaned = re.sub(r'^```\w*\n?', '', cleaned)
+        cleaned = re.sub(r'\n?```$', '', cleaned)
+    return json.loads(cleaned)
+
+
+class LlmMetrics:
+    def __init__(self, window=200):
+        self.requests = 0
+        self.failures = 0
+        self.transcripts = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency, prompt, completion, transcripts, ok=True):
+        self.requests += 1
+        self.failures += not ok
+        self.transcripts += transcripts
+        self.prompt_tokens += estimate_tokens(prompt)
+        self.completion_tokens += estimate_tokens(completion) if completion else 0
+        self.latencies.append(latency)
+
+    def snapshot(self):
+        ordered = sorted(self.latencies)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else None
+
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "transcripts": self.transcripts,
+            "prompt_tokens_est": self.prompt_tokens,
+            "completion_tokens_est": self.completion_tokens,
+            "latency_p50": pct(0.5),
+            "latency_p95": pct(0.95),
+        }
+
+
+class LlmSummaryClient:
+    """Long-lived summarizer around emergentintegrations' LlmChat.
+
+    The library is imported and configured once, on first use. LlmChat
+    sessions accumulate history, so every request opens its own chat
+    rather than sharing one; `max_concurrency` caps requests in flight.
+    summarize_batch() puts several transcripts in one prompt and splits
+    the token budget between them.
+    """
+
+    def __init__(self, api_key, provider="openai", model="gpt-5.2", max_prompt_tokens=3000, max_concurrency=8):
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+        self.max_prompt_tokens = max_prompt_tokens
+        self.metrics = LlmMetrics()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._classes = None
+
+    def _chat(self):
+        if self._classes is None:
+            from emergentintegrations.llm.chat import LlmChat, UserMessage
+            self._classes = (LlmChat, UserMessage)
+        chat_cls, message_cls = self._classes
+        chat = chat_cls(
+            api_key=self.api_key,
+            session_id=f"summary-{uuid.uuid4().hex[:8]}",
+            system_message=SYSTEM_MESSAGE,
+        ).with_model(self.provider, self.model)
+        return chat, message_cls
+
+    async def _send(self, prompt, transcripts):
+        chat, message_cls = self._chat()
+        async with self._slots:
+            started = time.monotonic()
+            try:
+                response = await chat.send_message(message_cls(text=prompt))
+            except Exception:
+                self.metrics.record(time.monotonic() - started, prompt, None, transcripts, ok=False)
+                raise
+        self.metrics.record(time.monotonic() - started, prompt, response, transcripts)
+        return parse_json_response(response)
+
+    async def summarize(self, transcript):
+        prompt = f"""Summarize this call transcript. Return ONLY valid JSON:
+{SUMMARY_SCHEMA}
+
+Transcript:
+{fit_transcript(transcript, self.max_prompt_tokens)}"""
+        summary = await self._send(prompt, 1)
+        if not isinstance(summary, dict):
+            raise ValueError("LLM response is not a JSON object")
+        return summary
+
+    async def summarize_batch(self, transcripts):
+        """One summary per transcript, in order, from a single request."""
+        if len(transcripts) == 1:
+            return [await self.summarize(transcripts[0])]
+        budget = self.max_prompt_tokens // len(transcripts)
+        sections = "\n\n".join(
+            f"### Call {i + 1}\n{fit_transcript(transcript, budget)}" for i, transcript in enumerate(transcripts)
+        )
+        prompt = f"""Summarize each of these {len(transcripts)} call transcripts. Return ONLY a valid JSON array with one object per call, in order, each shaped:
+{SUMMARY_SCHEMA}
+
+{sections}"""
+        summaries = await self._send(prompt, len(transcripts))
+        if not isinstance(summaries, list) or len(summaries) != len(transcripts) \
+                or not all(isinstance(s, dict) for s in summaries):
+            raise ValueError(f"expected a JSON array of {len(transcripts)} objects")
+        return summaries
+
+    def stats(self):
+        return {"model": f"{self.provider}/{self.model}", **self.metrics.snapshot()}
+
+
+class StubLlmClient:
+    """Offline stand-in for LlmSummaryClient: fallback summaries after a simulated round trip."""
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.metrics = LlmMetrics()
+
+    async def summarize(self, transcript):
+        return (await self.summarize_batch([transcript]))[0]
+
+    async def summarize_batch(self, transcripts):
+        from ai_engine import generate_fallback_summary
+
+        started = time.monotonic()
+        await asyncio.sleep(self.latency)
+        summaries = [generate_fallback_summary(t) for t in transcripts]
+        self.metrics.record(time.monotonic() - started, "", json.dumps(summaries), len(transcripts))
+        return summaries
+
+    def stats(self):
+        return {"model": "stub", **self.metrics.snapshot()}
+
+
+_shared_client = None
+
+
+def shared_llm_client():
+    """The process-wide LLM client: real with EMERGENT_LLM_KEY, the stub with
+    LLM_SUMMARY_STUB=1, otherwise None."""
+    global _shared_client
+    if _shared_client is None:
+        api_key = os.environ.get('EMERGENT_LLM_KEY', '')
+        if api_key:
+            _shared_client = LlmSummaryClient(
+                api_key,
+                max_prompt_tokens=int(os.environ.get('LLM_MAX_PROMPT_TOKENS', '3000')),
+                max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', '8')),
+            )
+        elif os.environ.get('LLM_SUMMARY_STUB', '').lower() in ("1", "true", "yes"):
+            _shared_client = StubLlmClient()
+    return _shared_client
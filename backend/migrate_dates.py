@@ -0,0 +1,93 @@
+"""Convert ISO-string timestamps to native BSON dates.
+
+Safe to run while the app is serving: each batch only touches documents
+whose field is still a string, so reruns and concurrent writers of native
+dates are unaffected. Usage:
+
+    python migrate_dates.py [--batch-size 500] [--dry-run]
+"""
+import argparse
+import asyncio
+
+from mongo_cli import cli_db
+
+# collection -> top-level (dotted) date fields
+DATE_FIELDS = {
+    "calls": ["started_at", "ended_at", "_last_message_time", "_created_at"],
+    "alerts": ["created_at", "acknowledged_at"],
+    "user_sessions": ["expires_at", "created_at"],
+    "users": ["created_at"],
+    "agents": ["shift.start", "shift.end"],
+    "transcripts": ["timestamp"],
+}
+# collection -> {array field: date field inside each element}
+ARRAY_DATE_FIELDS = {
+    "calls": {
+        "transcript": "timestamp",
+        "alerts_triggered": "triggered_at",
+        "supervisor_actions": "performed_at",
+    },
+}
+
+
+def _to_date(expr):
+    return {"$cond": [
+        {"$eq": [{"$type": expr}, "string"]},
+        {"$dateFromString": {"dateString": expr}},
+        expr,
+    ]}
+
+
+def field_migration(field):
+    return {field: {"$type": "string"}}, [{"$set": {field: _to_date(f"${field}")}}]
+
+
+def array_migration(array, field):
+    query = {f"{array}.{field}": {"$type": "string"}}
+    pipeline = [{"$set": {array: {"$map": {
+        "input": f"${array}",
+        "as": "item",
+        "in": {"$mergeObjects": ["$$item", {field: _to_date(f"$$item.{field}")}]},
+    }}}}]
+    return query, pipeline
+
+
+async def migrate(db, batch_size=500, dry_run=False):
+    """Convert every string date in batches; returns {"collection.field": converted_count}."""
+    plans = []
+    for collection, fields in DATE_FIELDS.items():
+        plans += [(collection, field, *field_migration(field)) for field in fields]
+    for collection, arrays in ARRAY_DATE_FIELDS.items():
+        plans += [(collection, f"{array}[].{field}", *array_migration(array, field)) for array, field in arrays.items()]
+
+    converted = {}
+    for collection, label, query, pipeline in plans:
+        coll = db[collection]
+        if dry_run:
+            converted[f"{collection}.{label}"] = await coll.count_documents(query)
+            continue
+        total = 0
+        while True:
+            ids = [d["_id"] for d in await coll.find(query, {"_id": 1}).limit(batch_size).to_list(batch_size)]
+            if not ids:
+                break
+            result = await coll.update_many({"_id": {"$in": ids}, **query}, pipeline)
+            total += result.modified_count
+        converted[f"{collection}.{label}"] = total
+    return converted
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Convert ISO-string timestamps to BSON dates")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only count documents still holding strings")
+    args = parser.parse_args()
+
+    async with cli_db() as db:
+        converted = await migrate(db, args.batch_size, args.dry_run)
+    for field, count in converted.items():
+        print(f"{field}: {count}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
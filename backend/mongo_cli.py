@@ -0,0 +1,35 @@
+"""Shared pieces of the maintenance CLIs and worker processes.
+
+Motor and dotenv are imported inside `cli_db` so modules the server loads
+(live_metrics, analytics_rollup) can use `as_datetime` without pulling
+them in at import time.
+"""
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def as_datetime(value):
+    """ISO strings and naive datetimes as aware UTC datetimes; anything else (None) as-is."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+@asynccontextmanager
+async def cli_db():
+    """The configured database from backend/.env; the client is closed on exit."""
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        yield client[os.environ['DB_NAME']]
+    finally:
+        client.close()
@@ -0,0 +1,59 @@
+import base64
+import json
+from datetime import datetime
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _pack(value):
+    if isinstance(value, datetime):
+        return ["d", value.isoformat()]
+    return ["v", value]
+
+
+def _unpack(packed):
+    kind, value = packed
+    return datetime.fromisoformat(value) if kind == "d" else value
+
+
+def encode_cursor(sort_value, tie_value=None) -> str:
+    raw = json.dumps([_pack(sort_value), _pack(tie_value)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Returns (sort_value, tie_value); raises ValueError for a malformed token."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        sort_value, tie_value = json.loads(raw)
+        return _unpack(sort_value), _unpack(tie_value)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+
+def keyset_filter(cursor: str, sort_field, tie_field=None, descending=True):
+    """Filter selecting rows strictly after the cursor in (sort_field, tie_field) order."""
+    sort_value, tie_value = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    if tie_field is None:
+        return {sort_field: {op: sort_value}}
+    return {"$or": [
+        {sort_field: {op: sort_value}},
+        {sort_field: sort_value, tie_field: {op: tie_value}},
+    ]}
+
+
+def keyset_sort(sort_field, tie_field=None, descending=True):
+    direction = -1 if descending else 1
+    sort = [(sort_field, direction)]
+    if tie_field:
+        sort.append((tie_field, direction))
+    return sort
+
+
+def next_cursor(items, limit, sort_field, tie_field=None):
+    """Cursor for the page after `items`, or None when this was the last page."""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last.get(sort_field), last.get(tie_field) if tie_field else None)
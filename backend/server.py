@@ -1,7 +1,9 @@
 from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone, timedelta
@@ -10,18 +12,27 @@ import uuid
 import logging
 import json
 import asyncio
-import httpx
 from pathlib import Path
 
-from ai_engine import analyze_message, summarize_call_llm
-from call_simulator import SimulationEngine, AGENT_PROFILES
+from ws_manager import ConnectionManager
+from session_cache import SessionCache, RedisSessionBackend
+from live_metrics import LiveMetrics
+from indexes import reconcile_if_changed
+from warmup import WarmUp
+from http_client import SharedHttpClient
+from summary_queue import SummaryQueue
+from analytics_rollup import hourly_buckets
+from transcripts import fetch_transcript
+from export import EXPORT_BATCH_SIZE, EXPORT_PROJECTION, MEDIA_TYPES, STREAMERS, available_formats, export_query, gzip_stream
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, keyset_filter, keyset_sort, next_cursor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware so stored BSON dates come back as UTC datetimes and serialize with an offset
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 app = FastAPI()
@@ -31,29 +42,50 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 
-# ─── WebSocket Connection Manager ───
-class ConnectionManager:
-    def __init__(self):
-        self.connections: set = set()
+ws_manager = ConnectionManager()
+session_cache = SessionCache(
+    ttl=int(os.environ.get('SESSION_CACHE_TTL', '60')),
+    max_size=int(os.environ.get('SESSION_CACHE_SIZE', '10000')),
+    backend=RedisSessionBackend(os.environ['SESSION_CACHE_REDIS_URL']) if os.environ.get('SESSION_CACHE_REDIS_URL') else None,
+)
+live_metrics = LiveMetrics(db)
+# One pooled client for the OAuth session exchange, so logins reuse warm connections
+auth_http = SharedHttpClient(
+    timeout=float(os.environ.get('AUTH_HTTP_TIMEOUT', '10')),
+    max_connections=int(os.environ.get('AUTH_HTTP_MAX_CONNECTIONS', '100')),
+    max_in_flight=int(os.environ.get('AUTH_HTTP_MAX_IN_FLIGHT', '50')),
+    retries=int(os.environ.get('AUTH_HTTP_RETRIES', '2')),
+)
+simulation = None  # SimulationEngine (or ShardedSimulation), created on first start
+# "sharded": the simulator runs as sim_shards.py worker processes and this process only relays their events
+SIMULATION_SHARDED = os.environ.get('SIMULATION_MODE', 'inline') == 'sharded'
+shard_relay = None
 
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        self.connections.add(ws)
 
-    def disconnect(self, ws: WebSocket):
-        self.connections.discard(ws)
+def new_simulation():
+    if SIMULATION_SHARDED:
+        from sim_shards import ShardedSimulation
 
-    async def broadcast(self, message: dict):
-        dead = set()
-        for ws in self.connections:
-            try:
-                await ws.send_json(message)
-            except Exception:
-                dead.add(ws)
-        self.connections -= dead
+        return ShardedSimulation(db, live_metrics)
+    # Deferred: the simulator pulls in the scenario tables and the analyzer
+    from call_simulator import SimulationEngine
 
-ws_manager = ConnectionManager()
-simulation: Optional[SimulationEngine] = None
+    return SimulationEngine(db, publish, metrics=live_metrics, summaries=summary_queue)
+
+
+async def publish(message: dict):
+    """Apply an event to the live KPIs, then fan it out to WebSocket clients."""
+    live_metrics.observe(message)
+    await ws_manager.broadcast(message)
+
+
+summary_queue = SummaryQueue(
+    db, publish,
+    workers=int(os.environ.get('LLM_SUMMARY_WORKERS', '4')),
+    batch_size=int(os.environ.get('LLM_SUMMARY_BATCH', '4')),
+    timeout=float(os.environ.get('LLM_SUMMARY_TIMEOUT', '30')),
+    retries=int(os.environ.get('LLM_SUMMARY_RETRIES', '2')),
+)
 
 
 # ─── Pydantic Models ───
@@ -82,6 +114,9 @@ async def get_current_user(request: Request):
             session_token = auth_header[7:]
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
+    cached = await session_cache.get(session_token)
+    if cached:
+        return cached
     session = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
     if not session:
         raise HTTPException(status_code=401, detail="Invalid session")
@@ -95,43 +130,69 @@ async def get_current_user(request: Request):
     user = await db.users.find_one({"user_id": session["user_id"]}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    await session_cache.set(session_token, user, expires_at)
     return user
 
 
+def with_cursor(query: dict, cursor: Optional[str], sort_field: str, tie_field: str) -> dict:
+    """Narrow a descending (sort_field, tie_field) query to rows after an opaque page cursor."""
+    if not cursor:
+        return query
+    try:
+        return {**query, **keyset_filter(cursor, sort_field, tie_field)}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]):
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+
+
 # ─── Auth Endpoints ───
 @api_router.get("/auth/session")
 async def auth_session(session_id: str, response: Response):
+    import httpx
+
     # REMINDER: DO NOT HARDCODE THE URL, OR ADD ANY FALLBACKS OR REDIRECT URLS, THIS BREAKS THE AUTH
-    async with httpx.AsyncClient() as http_client:
-        result = await http_client.get(
+    try:
+        result = await auth_http.get(
             "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
             headers={"X-Session-ID": session_id}
         )
+    except httpx.HTTPError as e:
+        logger.error(f"Session exchange failed: {e}")
+        raise HTTPException(status_code=503, detail="Authentication service unavailable")
     if result.status_code != 200:
         raise HTTPException(status_code=401, detail="Invalid session")
     user_data = result.json()
 
-    existing = await db.users.find_one({"email": user_data["email"]}, {"_id": 0})
-    if existing:
-        user_id = existing["user_id"]
-    else:
-        user_id = f"user_{uuid.uuid4().hex[:12]}"
-        await db.users.insert_one({
-            "user_id": user_id,
+    # Upserts: email and session_token are unique, and the same session can be exchanged twice
+    user = await db.users.find_one_and_update(
+        {"email": user_data["email"]},
+        {"$setOnInsert": {
+            "user_id": f"user_{uuid.uuid4().hex[:12]}",
             "email": user_data["email"],
             "name": user_data["name"],
             "picture": user_data.get("picture", ""),
             "role": "supervisor",
-            "created_at": datetime.now(timezone.utc).isoformat(),
-        })
+            "created_at": datetime.now(timezone.utc),
+        }},
+        projection={"_id": 0, "user_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    user_id = user["user_id"]
 
     session_token = user_data.get("session_token", f"st_{uuid.uuid4().hex}")
-    await db.user_sessions.insert_one({
-        "user_id": user_id,
-        "session_token": session_token,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat(),
-    })
+    await db.user_sessions.update_one(
+        {"session_token": session_token},
+        {"$set": {
+            "user_id": user_id,
+            "expires_at": datetime.now(timezone.utc) + timedelta(days=7),
+        }, "$setOnInsert": {"created_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
 
     response.set_cookie(
         key="session_token", value=session_token,
@@ -145,10 +206,17 @@ async def auth_me(request: Request):
     return await get_current_user(request)
 
 
+@api_router.get("/auth/cache-stats")
+async def auth_cache_stats(request: Request):
+    await get_current_user(request)
+    return session_cache.stats()
+
+
 @api_router.post("/auth/logout")
 async def auth_logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     if session_token:
+        await session_cache.invalidate(session_token)
         await db.user_sessions.delete_one({"session_token": session_token})
     response.delete_cookie("session_token", path="/", samesite="none", secure=True)
     return {"message": "Logged out"}
@@ -162,18 +230,23 @@ async def get_active_calls(request: Request):
         {"status": {"$in": ["active", "ringing", "on_hold", "wrapping_up"]}},
         {"_id": 0, "call_id": 1, "status": 1, "channel": 1, "started_at": 1,
          "customer": 1, "agent": 1, "health_score": 1, "duration_seconds": 1,
-         "ai_summary": 1, "alerts_triggered": 1, "transcript": {"$slice": -1}}
+         "ai_summary": 1, "alerts_triggered": 1, "transcript_tail": 1}
     ).sort("started_at", -1).to_list(50)
+    for call in calls:
+        tail = call.pop("transcript_tail", None)
+        call["transcript"] = [tail] if tail else []
     return calls
 
 
 @api_router.get("/calls/history")
-async def get_call_history(request: Request, limit: int = 50, skip: int = 0):
+async def get_call_history(request: Request, response: Response, limit: int = 50, skip: int = 0, cursor: Optional[str] = None):
     await get_current_user(request)
+    query = with_cursor({"status": "ended"}, cursor, "ended_at", "call_id")
     calls = await db.calls.find(
-        {"status": "ended"},
-        {"_id": 0, "transcript": 0, "_scenario": 0, "_message_index": 0, "_last_message_time": 0, "_created_at": 0}
-    ).sort("ended_at", -1).skip(skip).limit(limit).to_list(limit)
+        query,
+        {"_id": 0, "transcript": 0, "transcript_tail": 0, "_scenario": 0, "_message_index": 0, "_last_message_time": 0, "_created_at": 0}
+    ).sort(keyset_sort("ended_at", "call_id")).skip(0 if cursor else skip).limit(limit).to_list(limit)
+    set_next_cursor(response, next_cursor(calls, limit, "ended_at", "call_id"))
     return calls
 
 
@@ -182,23 +255,27 @@ async def get_call_detail(call_id: str, request: Request):
     await get_current_user(request)
     call = await db.calls.find_one(
         {"call_id": call_id},
-        {"_id": 0, "_scenario": 0, "_message_index": 0, "_last_message_time": 0, "_created_at": 0}
+        {"_id": 0, "transcript": 0, "transcript_tail": 0, "_scenario": 0, "_message_index": 0, "_last_message_time": 0, "_created_at": 0}
     )
     if not call:
         raise HTTPException(status_code=404, detail="Call not found")
+    call["transcript"] = await fetch_transcript(db, call_id)
     return call
 
 
 @api_router.get("/calls/{call_id}/transcript")
-async def get_call_transcript(call_id: str, request: Request, skip: int = 0, limit: int = 100):
+async def get_call_transcript(call_id: str, request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
     await get_current_user(request)
-    call = await db.calls.find_one(
-        {"call_id": call_id},
-        {"_id": 0, "transcript": {"$slice": [skip, limit]}}
-    )
-    if not call:
+    if cursor:
+        try:
+            skip = int(decode_cursor(cursor)[0])
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    transcript = await fetch_transcript(db, call_id, skip, limit)
+    set_next_cursor(response, encode_cursor(skip + limit) if len(transcript) == limit else None)
+    if not transcript and not await db.calls.find_one({"call_id": call_id}, {"_id": 0, "call_id": 1}):
         raise HTTPException(status_code=404, detail="Call not found")
-    return call.get("transcript", [])
+    return transcript
 
 
 @api_router.post("/calls/{call_id}/action")
@@ -212,13 +289,13 @@ async def perform_call_action(call_id: str, action: SupervisorAction, request: R
         "action": action.action,
         "details": action.details,
         "performed_by": user["user_id"],
-        "performed_at": datetime.now(timezone.utc).isoformat(),
+        "performed_at": datetime.now(timezone.utc),
     }
     await db.calls.update_one(
         {"call_id": call_id},
         {"$push": {"supervisor_actions": action_doc}}
     )
-    await ws_manager.broadcast({
+    await publish({
         "type": "supervisor_action",
         "data": {"call_id": call_id, "action": action_doc}
     })
@@ -237,12 +314,13 @@ async def get_active_alerts(request: Request, limit: int = 50):
 
 
 @api_router.get("/alerts/history")
-async def get_alert_history(request: Request, limit: int = 100, skip: int = 0):
+async def get_alert_history(request: Request, response: Response, limit: int = 100, skip: int = 0, cursor: Optional[str] = None):
     await get_current_user(request)
     alerts = await db.alerts.find(
-        {},
+        with_cursor({}, cursor, "created_at", "alert_id"),
         {"_id": 0}
-    ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    ).sort(keyset_sort("created_at", "alert_id")).skip(0 if cursor else skip).limit(limit).to_list(limit)
+    set_next_cursor(response, next_cursor(alerts, limit, "created_at", "alert_id"))
     return alerts
 
 
@@ -254,12 +332,12 @@ async def acknowledge_alert(alert_id: str, request: Request):
         {"$set": {
             "status": "acknowledged",
             "acknowledged_by": user["user_id"],
-            "acknowledged_at": datetime.now(timezone.utc).isoformat(),
+            "acknowledged_at": datetime.now(timezone.utc),
         }}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Alert not found or already acknowledged")
-    await ws_manager.broadcast({"type": "alert_acknowledged", "data": {"alert_id": alert_id}})
+    await publish({"type": "alert_acknowledged", "data": {"alert_id": alert_id}})
     return {"message": "Alert acknowledged"}
 
 
@@ -272,12 +350,12 @@ async def resolve_alert(alert_id: str, request: Request, notes: str = ""):
             "status": "resolved",
             "resolution_notes": notes,
             "acknowledged_by": user["user_id"],
-            "acknowledged_at": datetime.now(timezone.utc).isoformat(),
+            "acknowledged_at": datetime.now(timezone.utc),
         }}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Alert not found")
-    await ws_manager.broadcast({"type": "alert_resolved", "data": {"alert_id": alert_id}})
+    await publish({"type": "alert_resolved", "data": {"alert_id": alert_id}})
     return {"message": "Alert resolved"}
 
 
@@ -299,12 +377,13 @@ async def get_agent_detail(agent_id: str, request: Request):
 
 
 @api_router.get("/agents/{agent_id}/calls")
-async def get_agent_calls(agent_id: str, request: Request, limit: int = 20):
+async def get_agent_calls(agent_id: str, request: Request, response: Response, limit: int = 20, skip: int = 0, cursor: Optional[str] = None):
     await get_current_user(request)
     calls = await db.calls.find(
-        {"agent.id": agent_id},
-        {"_id": 0, "transcript": 0, "_scenario": 0, "_message_index": 0, "_last_message_time": 0, "_created_at": 0}
-    ).sort("started_at", -1).limit(limit).to_list(limit)
+        with_cursor({"agent.id": agent_id}, cursor, "started_at", "call_id"),
+        {"_id": 0, "transcript": 0, "transcript_tail": 0, "_scenario": 0, "_message_index": 0, "_last_message_time": 0, "_created_at": 0}
+    ).sort(keyset_sort("started_at", "call_id")).skip(0 if cursor else skip).limit(limit).to_list(limit)
+    set_next_cursor(response, next_cursor(calls, limit, "started_at", "call_id"))
     return calls
 
 
@@ -312,75 +391,22 @@ async def get_agent_calls(agent_id: str, request: Request, limit: int = 20):
 @api_router.get("/analytics/realtime")
 async def get_realtime_analytics(request: Request):
     await get_current_user(request)
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-
-    # Single aggregation for active call metrics
-    pipeline = [
-        {"$match": {"status": {"$in": ["active", "ringing", "on_hold"]}}},
-        {"$group": {
-            "_id": None,
-            "count": {"$sum": 1},
-            "avg_sentiment": {"$avg": "$ai_summary.overall_sentiment"},
-            "max_duration": {"$max": "$duration_seconds"},
-            "avg_health": {"$avg": "$health_score"},
-        }}
-    ]
-    agg_result = await db.calls.aggregate(pipeline).to_list(1)
-    active_data = agg_result[0] if agg_result else {"count": 0, "avg_sentiment": 0, "max_duration": 0, "avg_health": 50}
-
-    # Single aggregation for today's call counts
-    today_pipeline = [
-        {"$match": {"started_at": {"$gte": today_start}}},
-        {"$facet": {
-            "total": [{"$count": "n"}],
-            "ended": [{"$match": {"status": "ended"}}, {"$count": "n"}],
-        }}
-    ]
-    today_result = await db.calls.aggregate(today_pipeline).to_list(1)
-    today_data = today_result[0] if today_result else {"total": [], "ended": []}
-    total_today = today_data["total"][0]["n"] if today_data["total"] else 0
-    ended_today = today_data["ended"][0]["n"] if today_data["ended"] else 0
-
-    alert_count = await db.alerts.count_documents({"status": "active"})
-
-    return {
-        "active_calls": active_data["count"],
-        "avg_sentiment": round(active_data["avg_sentiment"] or 0, 2),
-        "alerts_count": alert_count,
-        "longest_call": active_data["max_duration"] or 0,
-        "total_calls_today": total_today,
-        "resolved_today": ended_today,
-        "avg_health_score": round(active_data["avg_health"] or 50, 1),
-    }
+    return live_metrics.snapshot()
 
 
 @api_router.get("/analytics/hourly")
 async def get_hourly_analytics(request: Request):
     await get_current_user(request)
     now = datetime.now(timezone.utc)
-    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-
-    # Single aggregation for all hourly data
-    pipeline = [
-        {"$match": {"started_at": {"$gte": start_of_day}}},
-        {"$addFields": {"hour_val": {"$hour": {"$dateFromString": {"dateString": "$started_at"}}}}},
-        {"$group": {
-            "_id": "$hour_val",
-            "calls": {"$sum": 1},
-            "avg_sentiment": {"$avg": "$ai_summary.overall_sentiment"},
-        }},
-        {"$sort": {"_id": 1}},
-    ]
-    results = await db.calls.aggregate(pipeline).to_list(24)
-    hour_map = {r["_id"]: r for r in results}
-    current_hour = now.hour
+    hour_map = {b["hour"]: b for b in await hourly_buckets(db, now)}
     hours = []
-    for i in range(current_hour + 1):
+    for i in range(now.hour + 1):
         data = hour_map.get(i, {})
+        count = data.get("sentiment_count", 0)
         hours.append({
             "hour": i,
             "calls": data.get("calls", 0),
-            "avg_sentiment": round(data.get("avg_sentiment", 0) or 0, 2),
+            "avg_sentiment": round(data.get("sentiment_sum", 0) / count, 2) if count else 0,
         })
     return hours
 
@@ -395,26 +421,43 @@ async def get_agent_analytics(request: Request):
 @api_router.get("/analytics/issues")
 async def get_issue_analytics(request: Request):
     await get_current_user(request)
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-
-    # Aggregation pipeline for issue counts
-    pipeline = [
-        {"$match": {"started_at": {"$gte": today_start}}},
-        {"$group": {"_id": "$ai_summary.primary_issue", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-    ]
-    results = await db.calls.aggregate(pipeline).to_list(100)
-    return [{"issue": r["_id"] or "Unknown", "count": r["count"]} for r in results]
+    counts = {}
+    for bucket in await hourly_buckets(db, datetime.now(timezone.utc)):
+        for issue, count in (bucket.get("issues") or {}).items():
+            counts[issue] = counts.get(issue, 0) + count
+    return [{"issue": issue, "count": count} for issue, count in sorted(counts.items(), key=lambda kv: -kv[1])]
 
 
-@api_router.post("/analytics/export")
-async def export_analytics(request: Request):
+def parse_export_time(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected an ISO date or datetime")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@api_router.api_route("/analytics/export", methods=["GET", "POST"])
+async def export_analytics(
+    request: Request,
+    format: str = "ndjson",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    gzip: bool = False,
+):
     await get_current_user(request)
-    calls = await db.calls.find(
-        {"status": "ended"},
-        {"_id": 0, "transcript": 0, "_scenario": 0, "_message_index": 0, "_last_message_time": 0, "_created_at": 0}
-    ).sort("ended_at", -1).limit(500).to_list(500)
-    return {"export_data": calls, "exported_at": datetime.now(timezone.utc).isoformat(), "count": len(calls)}
+    if format not in available_formats():
+        raise HTTPException(status_code=400, detail=f"Unsupported format; available: {', '.join(available_formats())}")
+    query = export_query(parse_export_time(start, "start"), parse_export_time(end, "end"), agent_id)
+    cursor = db.calls.find(query, EXPORT_PROJECTION).sort("ended_at", -1).batch_size(EXPORT_BATCH_SIZE)
+    body = STREAMERS[format](cursor)
+    filename = f"calls-export-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}{".gz" if gzip else ""}"'}
+    if gzip:
+        body = gzip_stream(body)
+    return StreamingResponse(body, media_type="application/gzip" if gzip else MEDIA_TYPES[format], headers=headers)
 
 
 # ─── Simulation Endpoints ───
@@ -424,7 +467,10 @@ async def start_simulation(request: Request):
     global simulation
     if simulation and simulation.running:
         return {"message": "Simulation already running"}
-    simulation = SimulationEngine(db, ws_manager.broadcast)
+    if warmup.pending("stale_cleanup"):
+        # Cleanup would delete the new calls and alerts along with the stale ones
+        raise HTTPException(status_code=503, detail="Server is still starting up, try again shortly")
+    simulation = new_simulation()
     await simulation.start()
     return {"message": "Simulation started"}
 
@@ -466,8 +512,19 @@ async def get_simulation_status(request: Request):
     await get_current_user(request)
     global simulation
     if simulation:
-        return {"running": simulation.running, "config": simulation.config, "active_calls": len(simulation.active_calls)}
-    return {"running": False, "config": {}, "active_calls": 0}
+        writer = getattr(simulation, "writer", None)  # sharded workers keep their own
+        return {"running": simulation.running, "config": simulation.config, "active_calls": len(simulation.active_calls),
+                "summaries": summary_queue.stats(), "writer": writer.stats() if writer else None}
+    return {"running": False, "config": {}, "active_calls": 0, "summaries": summary_queue.stats()}
+
+
+# ─── Health Endpoints ───
+@api_router.get("/health/ready")
+async def health_ready(response: Response):
+    report = warmup.report()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
 
 
 # ─── WebSocket Endpoints ───
@@ -477,9 +534,16 @@ async def websocket_live(websocket: WebSocket):
     try:
         while True:
             data = await websocket.receive_text()
-            # Client can send ping/pong or commands
+            # Client can send ping/pong or subscription commands
             if data == "ping":
-                await websocket.send_json({"type": "pong"})
+                ws_manager.send(websocket, {"type": "pong"})
+                continue
+            try:
+                command = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(command, dict):
+                ws_manager.handle_command(websocket, command)
     except WebSocketDisconnect:
         ws_manager.disconnect(websocket)
     except Exception:
@@ -487,37 +551,67 @@ async def websocket_live(websocket: WebSocket):
 
 
 # ─── Startup / Shutdown ───
+STALE_CLEANUP_BATCH = int(os.environ.get('STALE_CLEANUP_BATCH', '500'))
+warmup = WarmUp(
+    steps=["database", "indexes", "stale_cleanup", "live_metrics", "summaries", "simulation"],
+    required=["database", "stale_cleanup"],
+)
+
+
+async def warm_up():
+    global simulation, shard_relay
+    async with warmup.step("database"):
+        await db.command("ping")
+    warmup.spawn(reconcile_indexes())
+    async with warmup.step("stale_cleanup"):
+        # Sharded workers clean up their own partitions; live calls here may belong to them
+        if not SIMULATION_SHARDED:
+            from call_simulator import clear_stale_calls
+
+            await clear_stale_calls(db, batch_size=STALE_CLEANUP_BATCH)
+    async with warmup.step("live_metrics"):
+        await live_metrics.start(int(os.environ.get('METRICS_RECONCILE_INTERVAL', '60')))
+    async with warmup.step("summaries"):
+        await summary_queue.start()
+    # Start simulation automatically
+    async with warmup.step("simulation"):
+        if SIMULATION_SHARDED:
+            from sim_shards import ShardEventRelay
+
+            shard_relay = ShardEventRelay(db, publish, live_metrics)
+            await shard_relay.start()
+        if simulation is None:  # not already started through /simulation/start
+            simulation = new_simulation()
+            await simulation.start()
+            logger.info("Simulation auto-started")
+
+
+async def reconcile_indexes():
+    async with warmup.step("indexes"):
+        result = await reconcile_if_changed(db)
+        if result is None:
+            logger.info("Indexes unchanged, skipping reconcile")
+
+
 @app.on_event("startup")
 async def startup():
-    global simulation
     logger.info("Starting application...")
-    # Create indexes for production performance
-    await db.calls.create_index("call_id")
-    await db.calls.create_index("status")
-    await db.calls.create_index("started_at")
-    await db.calls.create_index([("status", 1), ("started_at", -1)])
-    await db.alerts.create_index("alert_id")
-    await db.alerts.create_index("status")
-    await db.agents.create_index("agent_id")
-    await db.users.create_index("user_id")
-    await db.users.create_index("email")
-    await db.user_sessions.create_index("session_token")
-    # Clean old simulation data
-    await db.calls.delete_many(
-        {"status": {"$in": ["active", "ringing", "on_hold", "wrapping_up"]}}
-    )
-    await db.alerts.delete_many({"status": "active"})
-    # Start simulation automatically
-    simulation = SimulationEngine(db, ws_manager.broadcast)
-    await simulation.start()
-    logger.info("Simulation auto-started")
+    # Serve immediately; /api/health/ready reports warm-up progress
+    warmup.spawn(warm_up())
 
 
 @app.on_event("shutdown")
 async def shutdown():
     global simulation
-    if simulation:
+    await warmup.stop()
+    if shard_relay:
+        await shard_relay.stop()
+    # A sharded simulation belongs to its workers; stopping it here would stop every shard
+    if simulation and not SIMULATION_SHARDED:
         await simulation.stop()
+    await live_metrics.stop()
+    await summary_queue.stop()
+    await auth_http.close()
     client.close()
 
 
@@ -530,4 +624,5 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Content-Disposition"],
 )
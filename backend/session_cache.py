@@ -0,0 +1,110 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+class RedisSessionBackend:
+    """Shared session cache so every API worker sees logins and logouts."""
+
+    def __init__(self, url, prefix="callpulse:session:"):
+        if aioredis is None:
+            raise RuntimeError("redis package is required for a shared session cache")
+        self.redis = aioredis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, token):
+        raw = await self.redis.get(self.prefix + token)
+        return json.loads(raw) if raw else None
+
+    async def set(self, token, entry, ttl):
+        await self.redis.set(self.prefix + token, json.dumps(entry, default=lambda value: value.isoformat()), ex=max(1, int(ttl)))
+
+    async def delete(self, token):
+        await self.redis.delete(self.prefix + token)
+
+
+class SessionCache:
+    """TTL- and size-bounded cache of validated session token -> user.
+
+    An entry never outlives the session's own expires_at. With a shared
+    backend configured, the backend replaces the in-process LRU: a per-worker
+    copy would keep serving a token another worker just logged out.
+    """
+
+    def __init__(self, ttl=60, max_size=10000, backend=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.backend = backend
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, token):
+        if self.backend is not None:
+            try:
+                shared = await self.backend.get(token)
+            except Exception as e:
+                logger.warning(f"Shared session cache get failed: {e}")
+                shared = None
+            if shared and shared["expires_at"] > time.time():
+                self.hits += 1
+                return shared["user"]
+            self.misses += 1
+            return None
+        entry = self._entries.get(token)
+        if entry:
+            user, deadline = entry
+            if deadline > time.monotonic():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return user
+            del self._entries[token]
+        self.misses += 1
+        return None
+
+    async def set(self, token, user, expires_at: datetime):
+        ttl = min(self.ttl, (expires_at - datetime.now(timezone.utc)).total_seconds())
+        if ttl <= 0:
+            return
+        if self.backend is None:
+            self._store(token, user, ttl)
+            return
+        try:
+            await self.backend.set(token, {"user": user, "expires_at": expires_at.timestamp()}, ttl)
+        except Exception as e:
+            logger.warning(f"Shared session cache set failed: {e}")
+
+    async def invalidate(self, token):
+        self._entries.pop(token, None)
+        if self.backend is not None:
+            try:
+                await self.backend.delete(token)
+            except Exception as e:
+                logger.warning(f"Shared session cache delete failed: {e}")
+
+    def _store(self, token, user, ttl):
+        self._entries[token] = (user, time.monotonic() + ttl)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "shared_backend": type(self.backend).__name__ if self.backend is not None else None,
+        }
@@ -0,0 +1,271 @@
+"""Sharded simulation: the simulator as N worker processes instead of a task
+inside the API process.
+
+Each worker runs a SimulationEngine that only creates call_ids in its own
+hash partition (call_simulator.shard_of). Workers append every broadcast to
+the capped `sim_events` collection; each API process tails it into its own
+publish(), so every ConnectionManager and LiveMetrics sees all shards.
+Start/stop/config go through the `sim_control` document and trigger events
+through `sim_commands`, both polled by the workers.
+
+    SIMULATION_MODE=sharded uvicorn server:app ...    # API: relay, no local engine
+    python sim_shards.py --shards 8 --calls 10000     # simulator workers
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from pymongo import CursorType, ReturnDocument
+from pymongo.errors import CollectionInvalid
+
+from mongo_cli import cli_db
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLLECTION = "sim_events"
+CONTROL_COLLECTION = "sim_control"
+COMMAND_COLLECTION = "sim_commands"
+CONTROL_ID = "simulation"
+CONTROL_POLL_INTERVAL = 2
+WORKER_RESTART_DELAY = 5
+
+
+async def ensure_event_log(db, size_mb=256):
+    try:
+        await db.create_collection(EVENT_COLLECTION, capped=True, size=size_mb * 1024 * 1024)
+    except CollectionInvalid:
+        pass  # already exists
+
+
+def shard_share(total, index, shards):
+    """This shard's part of `total` calls; shares differ by at most one."""
+    return total // shards + (1 if index < total % shards else 0)
+
+
+# ─── API side ───
+class ShardEventRelay:
+    """Tails sim_events into this API process's publish(), and broadcasts
+    metrics_update from its LiveMetrics since the workers don't."""
+
+    def __init__(self, db, publish_fn, metrics, metrics_interval=4):
+        self.db = db
+        self.publish = publish_fn
+        self.metrics = metrics
+        self.metrics_interval = metrics_interval
+        self._tasks = []
+
+    async def start(self):
+        await ensure_event_log(self.db)
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._tail()), asyncio.create_task(self._publish_metrics())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _tail(self):
+        events = self.db[EVENT_COLLECTION]
+        # Only events from now on; history is in the calls collection
+        latest = await events.find({}, {"_id": 1}).sort("$natural", -1).limit(1).to_list(1)
+        last_id = latest[0]["_id"] if latest else None
+        while True:
+            # After a lost cursor this resumes by _id; ObjectIds from different
+            # workers aren't strictly ordered, so a few events can be skipped.
+            # LiveMetrics' periodic reconcile corrects the KPIs.
+            query = {"_id": {"$gt": last_id}} if last_id else {}
+            cursor = events.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                async for doc in cursor:
+                    last_id = doc["_id"]
+                    await self.publish(doc["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Simulation event relay error: {e}")
+            # A tailable cursor dies on an empty collection; wait and reopen
+            await asyncio.sleep(1)
+
+    async def _publish_metrics(self):
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            await self.publish(self.metrics.metrics_update())
+
+
+class ShardedSimulation:
+    """Stands in for SimulationEngine in the API process when the simulator
+    runs sharded: control calls are written for the workers to pick up."""
+
+    def __init__(self, db, metrics):
+        from call_simulator import DEFAULT_CONFIG
+
+        self.db = db
+        self.metrics = metrics
+        self.running = False
+        self.config = dict(DEFAULT_CONFIG)
+
+    @property
+    def active_calls(self):
+        return self.metrics.calls
+
+    async def _update_control(self, update):
+        if "config" not in update["$set"]:
+            update = {**update, "$setOnInsert": {"config": self.config}}
+        control = await self.db[CONTROL_COLLECTION].find_one_and_update(
+            {"_id": CONTROL_ID},
+            update,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self.running = control.get("running", False)
+        self.config = {**self.config, **(control.get("config") or {})}
+
+    async def start(self):
+        await self._update_control({"$set": {"running": True}})
+
+    async def stop(self):
+        await self._update_control({"$set": {"running": False}})
+
+    async def update_config(self, new_config):
+        await self._update_control({"$set": {"config": {**self.config, **new_config}}})
+
+    async def trigger_event(self, event_type):
+        from call_simulator import TRIGGER_SCENARIOS
+
+        if event_type not in TRIGGER_SCENARIOS:
+            return False
+        await self.db[COMMAND_COLLECTION].insert_one({"type": "trigger", "event_type": event_type})
+        return True
+
+
+# ─── Worker side ───
+async def run_shard(db, index, shards):
+    from bulk_writer import BulkWriter
+    from call_simulator import SimulationEngine, clear_stale_calls, shard_of
+    from summary_queue import SummaryQueue
+
+    await ensure_event_log(db)
+    removed = await clear_stale_calls(db, partition=lambda call_id: shard_of(call_id, shards) == index)
+    logger.info(f"Shard {index}/{shards}: removed {removed} stale calls")
+
+    events = BulkWriter(db)
+    await events.start()
+
+    async def relay(message):
+        events.insert_one(EVENT_COLLECTION, {"message": message})
+
+    summaries = SummaryQueue(db, relay)
+    await summaries.start()
+    engine = SimulationEngine(db, relay, summaries=summaries, shard=(index, shards), publish_metrics=False)
+    try:
+        while True:
+            try:
+                await _apply_control(db, engine, index, shards)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. a failed start; the next poll retries it
+                logger.error(f"Shard {index}/{shards}: control poll failed: {e}", exc_info=True)
+            await asyncio.sleep(CONTROL_POLL_INTERVAL)
+    finally:
+        if engine.running:
+            await engine.stop()
+        await summaries.stop()
+        await events.stop()
+
+
+async def _apply_control(db, engine, index, shards):
+    from call_simulator import DEFAULT_CONFIG
+
+    control = await db[CONTROL_COLLECTION].find_one({"_id": CONTROL_ID}) or {}
+    # Control holds the fleet-wide config; num_calls is split between shards
+    config = {**DEFAULT_CONFIG, **(control.get("config") or {})}
+    config["num_calls"] = shard_share(config["num_calls"], index, shards)
+    if config != engine.config:
+        if engine.running:
+            await engine.update_config(config)
+        else:
+            engine.config = config
+    if control.get("running", True) and not engine.running:
+        await engine.start()
+    elif not control.get("running", True) and engine.running:
+        await engine.stop()
+    while engine.running:
+        command = await db[COMMAND_COLLECTION].find_one_and_delete({"type": "trigger"})
+        if not command:
+            break
+        await engine.trigger_event(command["event_type"])
+
+
+def _shard_process(index, shards):
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - shard {index} - %(name)s - %(levelname)s - %(message)s')
+
+    async def main():
+        async with cli_db() as db:
+            task = asyncio.create_task(run_shard(db, index, shards))
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                asyncio.get_running_loop().add_signal_handler(sig, task.cancel)
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    asyncio.run(main())
+
+
+async def _set_total_calls(calls):
+    async with cli_db() as db:
+        await db[CONTROL_COLLECTION].update_one(
+            {"_id": CONTROL_ID}, {"$set": {"config.num_calls": calls, "running": True}}, upsert=True
+        )
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="Run the call simulator as sharded worker processes")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--calls", type=int, help="total concurrent calls across all shards")
+    args = parser.parse_args()
+
+    if args.calls is not None:
+        asyncio.run(_set_total_calls(args.calls))
+    spawned_at = {}
+
+    def spawn(index):
+        worker = multiprocessing.Process(target=_shard_process, args=(index, args.shards))
+        worker.start()
+        spawned_at[index] = time.monotonic()
+        return worker
+
+    workers = [spawn(i) for i in range(args.shards)]
+    stopping = False
+
+    def terminate(*_):
+        nonlocal stopping
+        stopping = True
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        # Supervise: a shard that exits is restarted so its partition keeps running
+        while not stopping:
+            time.sleep(1)
+            for index, worker in enumerate(workers):
+                # At most one restart per WORKER_RESTART_DELAY, so a crash loop doesn't spin
+                if worker.is_alive() or stopping or time.monotonic() - spawned_at[index] < WORKER_RESTART_DELAY:
+                    continue
+                logger.error(f"Shard {index} exited with code {worker.exitcode}, restarting")
+                workers[index] = spawn(index)
+    except KeyboardInterrupt:
+        terminate()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+
+from analytics_rollup import ROLLUP_COLLECTION, issue_changed_update
+
+logger = logging.getLogger(__name__)
+
+
+def transcript_hash(transcript):
+    """Content hash of a transcript's speaker/text pairs; identical conversations share a summary."""
+    content = json.dumps([[m.get("speaker"), m.get("text")] for m in transcript], separators=(",", ":"))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class SummaryQueue:
+    """Background LLM summarization of ended calls.
+
+    `_end_call` stores the instant fallback summary and enqueues the
+    transcript here; a small pool of workers replaces it with the LLM summary
+    off the simulation loop, then broadcasts `call_summary_ready`. When the
+    queue backs up, a worker drains up to `batch_size` calls into one
+    summarize_batch() request. Each request is bounded by a timeout and
+    retried with exponential backoff; summaries are cached by transcript
+    content hash.
+    """
+
+    def __init__(self, db, broadcast_fn, client=None, workers=4, batch_size=4, max_pending=1000,
+                 timeout=30.0, retries=2, backoff=1.0, cache_size=1000):
+        self.db = db
+        self.broadcast = broadcast_fn
+        self.client = client
+        self.workers = workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache_size = cache_size
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._tasks = []
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.cache_hits = 0
+
+    @property
+    def enabled(self):
+        return self.client is not None
+
+    async def start(self):
+        if self.client is None:
+            from llm_client import shared_llm_client
+            self.client = shared_llm_client()
+        if not self.enabled:
+            logger.info("LLM summaries disabled; calls keep their fallback summary")
+            return
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, call_id, transcript):
+        """Queue a call for summarization; returns False when disabled or the queue is full."""
+        if not self._tasks:
+            return False
+        try:
+            self._queue.put_nowait((call_id, transcript))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Summary queue full, {call_id} keeps its fallback summary")
+            return False
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._process(batch)
+            except Exception as e:
+                logger.error(f"Summaries for {[call_id for call_id, _ in batch]} failed: {e}", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch):
+        results, waiting, pending = [], [], []
+        for call_id, transcript in batch:
+            key = transcript_hash(transcript)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                results.append((call_id, self._cache[key]))
+            elif key in self._inflight:
+                # Same transcript already being summarized, possibly earlier in this batch
+                self.cache_hits += 1
+                waiting.append((call_id, self._inflight[key]))
+            else:
+                self._inflight[key] = asyncio.get_running_loop().create_future()
+                pending.append((call_id, transcript, key))
+
+        if pending:
+            summaries = [None] * len(pending)
+            try:
+                summaries = await self._summarize([call_id for call_id, _, _ in pending],
+                                                  [transcript for _, transcript, _ in pending])
+            finally:
+                for (call_id, _, key), summary in zip(pending, summaries):
+                    self._inflight.pop(key).set_result(summary)
+                    if summary is not None:
+                        self._cache[key] = summary
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            results.extend((call_id, summary) for (call_id, _, _), summary in zip(pending, summaries))
+        for call_id, future in waiting:
+            results.append((call_id, await asyncio.shield(future)))
+
+        for call_id, summary in results:
+            if summary is None:
+                self.failed += 1
+                continue
+            previous = await self.db.calls.find_one_and_update(
+                {"call_id": call_id},
+                {"$set": {"ai_summary": summary, "ai_summary_source": "llm"}},
+                projection={"_id": 0, "started_at": 1, "ai_summary.primary_issue": 1},
+            )
+            if previous and previous.get("started_at"):
+                # The hourly rollup counted the call under its previous issue
+                moved = issue_changed_update(previous["started_at"],
+                                             (previous.get("ai_summary") or {}).get("primary_issue"),
+                                             summary.get("primary_issue"))
+                if moved:
+                    await self.db[ROLLUP_COLLECTION].update_one(*moved)
+            self.completed += 1
+            await self.broadcast({"type": "call_summary_ready", "data": {"call_id": call_id, "ai_summary": summary}})
+
+    async def _summarize(self, call_ids, transcripts):
+        """Summaries for `transcripts` (None where it gave up): one batched request,
+        falling back to per-call requests if the batch keeps failing."""
+        if len(transcripts) > 1:
+            summaries = await self._with_retries(f"batch of {len(transcripts)}",
+                                                 lambda: self.client.summarize_batch(transcripts))
+            if summaries is not None:
+                return summaries
+        return list(await asyncio.gather(*(
+            self._with_retries(call_id, lambda t=transcript: self.client.summarize(t))
+            for call_id, transcript in zip(call_ids, transcripts)
+        )))
+
+    async def _with_retries(self, label, request):
+        for attempt in range(self.retries + 1):
+            try:
+                return await asyncio.wait_for(request(), self.timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(f"LLM summary for {label} gave up after {attempt + 1} attempts: {e}")
+                    return None
+                logger.warning(f"LLM summary for {label} failed ({e}), retrying")
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pending": self._queue.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self._cache),
+            "llm": self.client.stats() if self.client is not None else None,
+        }
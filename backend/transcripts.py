@@ -0,0 +1,73 @@
+"""Transcript storage: one document per utterance in `transcripts`, keyed by (call_id, seq).
+
+Keeping utterances out of the `calls` document keeps call documents small
+and fixed-size; the call only carries `transcript_tail`, its latest entry,
+for the live grid. Move transcripts embedded by older versions with:
+
+    python transcripts.py [--batch-size 100]
+"""
+import argparse
+import asyncio
+
+from mongo_cli import cli_db
+
+TRANSCRIPT_COLLECTION = "transcripts"
+
+
+def transcript_doc(call_id, seq, entry):
+    return {"call_id": call_id, "seq": seq, **entry}
+
+
+async def fetch_transcript(db, call_id, skip=0, limit=None):
+    """Entries [skip, skip + limit) of a call's transcript via an index range scan on (call_id, seq)."""
+    seq_range = {"$gte": skip}
+    if limit is not None:
+        seq_range["$lt"] = skip + limit
+    cursor = db[TRANSCRIPT_COLLECTION].find(
+        {"call_id": call_id, "seq": seq_range},
+        {"_id": 0, "call_id": 0, "seq": 0}
+    ).sort("seq", 1)
+    return await cursor.to_list(limit)
+
+
+async def migrate_embedded(db, batch_size=100):
+    """Move `calls.transcript` arrays into the transcripts collection; returns calls migrated."""
+    from pymongo import UpdateOne
+
+    migrated = 0
+    while True:
+        calls = await db.calls.find(
+            {"transcript": {"$exists": True}},
+            {"_id": 0, "call_id": 1, "transcript": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not calls:
+            return migrated
+        for call in calls:
+            entries = call.get("transcript") or []
+            if entries:
+                # Upserts keep a re-run after a partial failure idempotent
+                await db[TRANSCRIPT_COLLECTION].bulk_write([
+                    UpdateOne({"call_id": call["call_id"], "seq": seq},
+                              {"$setOnInsert": transcript_doc(call["call_id"], seq, entry)}, upsert=True)
+                    for seq, entry in enumerate(entries)
+                ], ordered=False)
+            await db.calls.update_one(
+                {"call_id": call["call_id"]},
+                {"$unset": {"transcript": ""}, "$set": {"transcript_tail": entries[-1] if entries else None}}
+            )
+            migrated += 1
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Move embedded call transcripts into the transcripts collection")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    async with cli_db() as db:
+        await db[TRANSCRIPT_COLLECTION].create_index([("call_id", 1), ("seq", 1)], unique=True)
+        migrated = await migrate_embedded(db, args.batch_size)
+    print(f"Migrated transcripts of {migrated} calls")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """Background startup steps and their progress, reported by /health/ready.
+
+    Steps are declared up front so pending ones show in the report. A failed
+    step is logged and recorded; the chain it belongs to carries on.
+    """
+
+    def __init__(self, steps, required):
+        self.steps = {name: {"status": "pending"} for name in steps}
+        self.required = required
+        self._tasks = set()
+        self._started = time.monotonic()
+
+    @asynccontextmanager
+    async def step(self, name):
+        self.steps[name] = {"status": "running"}
+        started = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self.steps[name] = {"status": "cancelled"}
+            raise
+        except Exception as e:
+            logger.error(f"Startup step {name} failed: {e}", exc_info=True)
+            self.steps[name] = {"status": "failed", "error": str(e)}
+        else:
+            self.steps[name] = {"status": "done", "seconds": round(time.monotonic() - started, 3)}
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def pending(self, name):
+        """Whether step `name` has yet to finish (successfully or not)."""
+        return self.steps[name]["status"] in ("pending", "running")
+
+    @property
+    def ready(self):
+        return all(self.steps[name]["status"] == "done" for name in self.required)
+
+    def report(self):
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.monotonic() - self._started, 1),
+            "steps": self.steps,
+        }
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
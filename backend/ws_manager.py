@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from fastapi import WebSocket
+
+from ws_protocol import CallStateTracker, encode_message, negotiate
+
+logger = logging.getLogger(__name__)
+
+# A client is disconnected once its oldest queued message has waited
+# WS_MAX_LAG seconds. One simulation tick enqueues a call_update per live
+# call before any writer runs, so a burst is not lag; WS_QUEUE_SIZE is only
+# a memory cap and must stay above the largest tick.
+WS_MAX_LAG = float(os.environ.get('WS_MAX_LAG', '10'))
+WS_QUEUE_SIZE = int(os.environ.get('WS_QUEUE_SIZE', '50000'))
+WS_SEND_TIMEOUT = 5
+# Only the latest pending message of these types is worth delivering
+COALESCED_TYPES = {"metrics_update"}
+# Every connection starts subscribed to the wildcard, so clients that never
+# send a subscription keep receiving everything.
+WILDCARD_TOPIC = "*"
+TYPE_TOPICS = {
+    "call_started": "calls",
+    "call_update": "calls",
+    "call_ended": "calls",
+    "call_summary_ready": "calls",
+    "supervisor_action": "calls",
+    "alert_new": "alerts",
+    "alert_acknowledged": "alerts",
+    "alert_resolved": "alerts",
+    "metrics_update": "metrics",
+}
+
+
+def message_topics(message: dict) -> set:
+    """Topics a message is routed to: its type group plus call:<id> / agent:<id>."""
+    topics = {WILDCARD_TOPIC}
+    group = TYPE_TOPICS.get(message.get("type"))
+    if group:
+        topics.add(group)
+    data = message.get("data")
+    if isinstance(data, dict):
+        if data.get("call_id"):
+            topics.add(f"call:{data['call_id']}")
+        agent_id = data.get("agent_id") or (data.get("agent") or {}).get("id")
+        if agent_id:
+            topics.add(f"agent:{agent_id}")
+    return topics
+
+
+class ClientChannel:
+    """Bounded queue of pre-encoded messages for one socket, drained by its own writer task.
+
+    `on_stop` is called when the writer gives up on the socket (lag or a
+    failed send) so the manager stops routing messages to it.
+    """
+
+    def __init__(self, ws: WebSocket, max_pending=WS_QUEUE_SIZE, max_lag=WS_MAX_LAG, on_stop=None):
+        self.ws = ws
+        self.max_pending = max_pending
+        self.max_lag = max_lag
+        self.on_stop = on_stop
+        self.pending = deque()
+        self.latest = {}
+        self.ready = asyncio.Event()
+        self.lagging = False
+        self.closing = False
+        self.topics = set()
+        self.protocol = "full"
+        self.encoding = "json"
+        self.task = asyncio.create_task(self._run())
+
+    def push(self, msg_type: str, payload) -> bool:
+        if msg_type in COALESCED_TYPES:
+            queued = msg_type in self.latest
+            self.latest[msg_type] = payload
+            if queued:
+                return True
+        now = time.monotonic()
+        if len(self.pending) >= self.max_pending or (self.pending and now - self.pending[0][2] > self.max_lag):
+            self.lagging = True
+            self.ready.set()
+            return False
+        self.pending.append((msg_type, payload, now))
+        self.ready.set()
+        return True
+
+    def close(self):
+        # The flag backs up cancel(): wait_for can swallow a cancellation that
+        # lands as a send completes, which would leave the writer waiting forever
+        self.closing = True
+        self.ready.set()
+        self.task.cancel()
+
+    async def _run(self):
+        try:
+            while True:
+                while not self.pending and not self.lagging and not self.closing:
+                    self.ready.clear()
+                    await self.ready.wait()
+                if self.closing:
+                    return
+                if self.lagging:
+                    await self._stop(1013)
+                    return
+                msg_type, payload, _ = self.pending.popleft()
+                if msg_type in COALESCED_TYPES:
+                    payload = self.latest.pop(msg_type)
+                if isinstance(payload, bytes):
+                    await asyncio.wait_for(self.ws.send_bytes(payload), WS_SEND_TIMEOUT)
+                else:
+                    await asyncio.wait_for(self.ws.send_text(payload), WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"WebSocket writer stopped: {e}")
+            await self._stop(1011)
+
+    async def _stop(self, code):
+        # Close the socket so the client's onclose fires and it reconnects
+        if self.on_stop:
+            self.on_stop(self.ws)
+        try:
+            await asyncio.wait_for(self.ws.close(code=code), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    def __init__(self):
+        self.connections: dict = {}
+        self.subscribers: dict = {}
+        self.call_states = CallStateTracker()
+
+    async def connect(self, ws: WebSocket):
+        await ws.accept()
+        self.connections[ws] = ClientChannel(ws, on_stop=self._forget)
+        self.subscribe(ws, [WILDCARD_TOPIC])
+
+    def disconnect(self, ws: WebSocket):
+        channel = self.connections.pop(ws, None)
+        if channel:
+            self._unindex(ws, channel.topics)
+            channel.close()
+
+    def subscribe(self, ws: WebSocket, topics):
+        channel = self.connections.get(ws)
+        if not channel:
+            return
+        for topic in topics:
+            channel.topics.add(topic)
+            self.subscribers.setdefault(topic, set()).add(ws)
+
+    def unsubscribe(self, ws: WebSocket, topics):
+        channel = self.connections.get(ws)
+        if not channel:
+            return
+        topics = channel.topics & set(topics)
+        channel.topics -= topics
+        self._unindex(ws, topics)
+
+    def handle_command(self, ws: WebSocket, command: dict):
+        """Apply a client command.
+
+        - {"action": "subscribe"|"unsubscribe", "topics": [...]}
+        - {"action": "hello", "protocol": "full"|"delta", "encoding": "json"|"msgpack"}
+        - {"action": "resync", "call_id": ...} to get a call_snapshot after a seq gap
+        """
+        channel = self.connections.get(ws)
+        if not channel:
+            return
+        action = command.get("action")
+        if action in ("subscribe", "unsubscribe") and isinstance(command.get("topics"), list):
+            topics = [str(t) for t in command["topics"]]
+            if action == "subscribe":
+                self.subscribe(ws, topics)
+            else:
+                self.unsubscribe(ws, topics)
+            self.send(ws, {"type": "subscriptions", "data": {"topics": sorted(channel.topics)}})
+        elif action == "hello":
+            channel.protocol, channel.encoding = negotiate(command.get("protocol"), command.get("encoding"))
+            self.send(ws, {"type": "hello", "data": {"protocol": channel.protocol, "encoding": channel.encoding}})
+        elif action == "resync":
+            snapshot = self.call_states.snapshot(command.get("call_id"))
+            if snapshot:
+                self.send(ws, snapshot)
+            else:
+                self.send(ws, {"type": "error", "data": {"message": f"Unknown call: {command.get('call_id')}"}})
+        else:
+            self.send(ws, {"type": "error", "data": {"message": f"Unknown command: {action}"}})
+
+    def _unindex(self, ws: WebSocket, topics):
+        for topic in topics:
+            subscribers = self.subscribers.get(topic)
+            if subscribers:
+                subscribers.discard(ws)
+                if not subscribers:
+                    del self.subscribers[topic]
+
+    def send(self, ws: WebSocket, message: dict):
+        channel = self.connections.get(ws)
+        if channel and not channel.push(message.get("type"), encode_message(message, channel.encoding)):
+            self._drop_lagging(ws)
+
+    async def broadcast(self, message: dict):
+        """Encode a message once per wire format and enqueue it for each subscribed connection.
+
+        Never waits on a socket. Delta-protocol connections get call_update
+        as a call_delta holding only the fields that changed.
+        """
+        delta = self.call_states.observe(message)
+        recipients = set()
+        for topic in message_topics(message):
+            recipients |= self.subscribers.get(topic, set())
+        if not recipients:
+            return
+        msg_type = message.get("type")
+        payloads = {}
+        connections = self.connections
+        lagging = []
+        for ws in recipients:
+            channel = connections[ws]
+            variant = ("delta" if delta and channel.protocol == "delta" else "full", channel.encoding)
+            payload = payloads.get(variant)
+            if payload is None:
+                payload = payloads[variant] = encode_message(delta if variant[0] == "delta" else message, channel.encoding)
+            if not channel.push(msg_type, payload):
+                lagging.append(ws)
+        for ws in lagging:
+            self._drop_lagging(ws)
+
+    def _forget(self, ws: WebSocket):
+        channel = self.connections.pop(ws, None)
+        if channel:
+            self._unindex(ws, channel.topics)
+
+    def _drop_lagging(self, ws: WebSocket):
+        # The writer task closes the socket itself once it sees the overflow
+        channel = self.connections.get(ws)
+        if channel:
+            self._forget(ws)
+            logger.warning(f"Disconnecting WebSocket client that fell more than {channel.max_lag}s behind")
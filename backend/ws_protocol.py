@@ -0,0 +1,114 @@
+import json
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# "full" is the original protocol; "delta" replaces call_update with call_delta
+PROTOCOLS = ("full", "delta")
+ENCODINGS = ("json", "msgpack")
+
+CALL_DELTA_KEYS = {
+    "call_id": "c",
+    "agent_id": "g",
+    "seq": "q",
+    "health_score": "h",
+    "avg_sentiment": "s",
+    "duration_seconds": "d",
+    "transcript_entry": "e",
+}
+ENTRY_KEYS = {"speaker": "p", "text": "x", "timestamp": "t", "analysis": "a"}
+ANALYSIS_KEYS = {"sentiment": "s", "intent": "i", "entities": "e", "flags": "f"}
+
+
+def available_encodings():
+    return [e for e in ENCODINGS if e != "msgpack" or msgpack]
+
+
+def negotiate(protocol, encoding):
+    """Pick the protocol/encoding a client asked for, falling back to what the server supports."""
+    protocol = protocol if protocol in PROTOCOLS else "full"
+    encoding = encoding if encoding in available_encodings() else "json"
+    return protocol, encoding
+
+
+def _encode_default(value):
+    # Stored timestamps are datetimes; clients get ISO 8601 strings as before
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def encode_message(message: dict, encoding="json"):
+    """Serialize a message once so the same payload can be sent to every client."""
+    if encoding == "msgpack" and msgpack:
+        return msgpack.packb(message, default=_encode_default)
+    if orjson:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=_encode_default)
+
+
+def _shorten(data, keys):
+    return {keys.get(k, k): v for k, v in data.items()}
+
+
+def compact_entry(entry):
+    short = _shorten(entry, ENTRY_KEYS)
+    if isinstance(short.get("a"), dict):
+        short["a"] = _shorten(short["a"], ANALYSIS_KEYS)
+    return short
+
+
+class CallStateTracker:
+    """Last known call_update fields per live call.
+
+    Used to turn each call_update into a call_delta carrying only the fields
+    that changed since the previous sequence number, and to answer resync
+    requests from delta clients that detect a gap.
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    def observe(self, message: dict):
+        """Record a broadcast message; returns the call_delta form of a call_update, else None."""
+        msg_type = message.get("type")
+        data = message.get("data") or {}
+        call_id = data.get("call_id")
+        if not call_id:
+            return None
+        if msg_type == "call_started":
+            self.calls[call_id] = {"call_id": call_id, "seq": 0}
+            return None
+        if msg_type == "call_ended":
+            self.calls.pop(call_id, None)
+            return None
+        if msg_type != "call_update":
+            return None
+
+        previous = self.calls.get(call_id, {})
+        data = {**data, "seq": data.get("seq", previous.get("seq", 0) + 1)}
+        # The transcript entry is an event rather than state, so it's always sent
+        changed = {
+            k: v for k, v in data.items()
+            if k in ("call_id", "seq", "transcript_entry") or previous.get(k) != v
+        }
+        self.calls[call_id] = {**previous, **data}
+
+        delta = _shorten(changed, CALL_DELTA_KEYS)
+        if "e" in delta:
+            delta["e"] = compact_entry(delta["e"])
+        return {"type": "call_delta", "data": delta}
+
+    def snapshot(self, call_id):
+        state = self.calls.get(call_id)
+        if state is None:
+            return None
+        return {"type": "call_snapshot", "data": dict(state)}
@@ -69,7 +69,7 @@ class ContactCenterAPITester:
                 'url': url
             })
 
-            return success, response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+            return success, response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
 
         except requests.exceptions.RequestException as e:
             print(f"❌ Failed - Network Error: {str(e)}")
@@ -207,13 +207,24 @@ class ContactCenterAPITester:
         if success4 and issues:
             print(f"   Issue types found: {len(issues)}")
 
-        # Export analytics
-        success5, export = self.run_test("Export Analytics", "POST", "analytics/export", 200)
-        if success5 and export:
-            exported_count = export.get('count', 0)
-            print(f"   Exported {exported_count} records")
-
-        return success1 and success2 and success3 and success4 and success5
+        # Export analytics: streamed, one call per NDJSON line / CSV row
+        success5, export = self.run_test("Export Analytics (NDJSON)", "GET", "analytics/export?format=ndjson", 200)
+        if success5:
+            records = [json.loads(line) for line in export.splitlines() if line]
+            if not all('call_id' in record for record in records):
+                print("❌ NDJSON export has records without call_id")
+                success5 = False
+            print(f"   Exported {len(records)} records")
+
+        success6, export = self.run_test("Export Analytics (CSV)", "POST", "analytics/export?format=csv", 200)
+        if success6:
+            rows = export.splitlines()
+            if not rows or not rows[0].startswith('call_id,'):
+                print("❌ CSV export is missing its header row")
+                success6 = False
+            print(f"   Exported {max(len(rows) - 1, 0)} rows")
+
+        return success1 and success2 and success3 and success4 and success5 and success6
 
     def test_simulation(self):
         """Test simulation endpoints"""
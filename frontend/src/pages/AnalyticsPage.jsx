@@ -44,12 +44,11 @@ export default function AnalyticsPage() {
 
   const handleExport = async () => {
     try {
-      const res = await axios.post(`${API}/analytics/export`, {}, { withCredentials: true });
-      const blob = new Blob([JSON.stringify(res.data, null, 2)], { type: 'application/json' });
-      const url = URL.createObjectURL(blob);
+      const res = await axios.get(`${API}/analytics/export`, { params: { format: 'csv' }, responseType: 'blob', withCredentials: true });
+      const url = URL.createObjectURL(res.data);
       const a = document.createElement('a');
       a.href = url;
-      a.download = `analytics-export-${new Date().toISOString().split('T')[0]}.json`;
+      a.download = `analytics-export-${new Date().toISOString().split('T')[0]}.csv`;
       a.click();
     } catch (e) { /* ignore */ }
   };
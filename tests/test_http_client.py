@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from http_client import SharedHttpClient
+
+
+def _client(handler, **kwargs):
+    return SharedHttpClient(transport=httpx.MockTransport(handler), backoff=0, **kwargs)
+
+
+def test_retries_gateway_errors_then_succeeds():
+    statuses = [503, 502, 200]
+
+    def handler(request):
+        return httpx.Response(statuses.pop(0), json={"ok": True})
+
+    async def run():
+        client = _client(handler, retries=2)
+        try:
+            return await client.get("https://auth.example/session")
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()).status_code == 200
+    assert statuses == []
+
+
+def test_returns_last_503_after_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    async def run():
+        client = _client(handler, retries=2)
+        try:
+            return await client.get("https://auth.example/session")
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()).status_code == 503
+    assert len(calls) == 3
+
+
+def test_does_not_retry_client_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(401)
+
+    async def run():
+        client = _client(handler, retries=2)
+        try:
+            return await client.get("https://auth.example/session")
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()).status_code == 401
+    assert len(calls) == 1
+
+
+def test_refused_connection_raises_after_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    async def run():
+        client = _client(handler, retries=1)
+        try:
+            await client.get("https://auth.example/session")
+        finally:
+            await client.close()
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_caps_requests_in_flight():
+    in_flight = peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200)
+
+    async def run():
+        client = _client(handler, max_in_flight=3)
+        try:
+            return await asyncio.gather(*(client.get(f"https://auth.example/{i}") for i in range(20)))
+        finally:
+            await client.close()
+
+    assert all(r.status_code == 200 for r in asyncio.run(run()))
+    assert peak == 3
@@ -0,0 +1,40 @@
+"""Cold `import server` stays within its import-time budget and leaves the
+heavy optional pieces (simulator, analyzer, LLM, HTTP, export encoders) unloaded."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+# Generous for CI machines; override with IMPORT_BUDGET_MS
+IMPORT_BUDGET_MS = int(os.environ.get("IMPORT_BUDGET_MS", "2000"))
+LAZY_MODULES = ["call_simulator", "ai_engine", "llm_client", "emergentintegrations", "httpx", "pyarrow", "sim_shards"]
+
+
+def _import_times():
+    """{module: cumulative microseconds} from `python -X importtime -c "import server"`."""
+    env = {**os.environ, "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+           "DB_NAME": os.environ.get("DB_NAME", "callpulse_test")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_server_import_within_budget():
+    times = _import_times()
+    assert times["server"] / 1000 <= IMPORT_BUDGET_MS, f"import server took {times['server'] / 1000:.0f} ms"
+    assert not [name for name in LAZY_MODULES if name in times]
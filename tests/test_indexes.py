@@ -0,0 +1,128 @@
+"""Index reconciliation against an in-memory collection, and (with a MongoDB at
+MONGO_URL) that every hot query shape is served by an index."""
+import asyncio
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from pymongo import IndexModel
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from indexes import _spec, ensure_indexes, explain
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeDatabase:
+    def __init__(self, coll):
+        self.coll = coll
+
+    async def command(self, name, collection, index):
+        self.coll.log.append(("collMod", dict(index)))
+        if index.get("unique") and self.coll.duplicates:
+            raise OperationFailure("cannot convert the index to unique", code=359)
+        info = self.coll.indexes[index["name"]]
+        info.update({k: v for k, v in index.items() if k in ("unique", "expireAfterSeconds")})
+
+
+class FakeCollection:
+    name = "coll"
+
+    def __init__(self, indexes, duplicates=False, build_error=None):
+        self.indexes = {"_id_": {"key": [("_id", 1)]}, **indexes}
+        self.duplicates = duplicates
+        self.build_error = build_error
+        self.log = []
+        self.database = FakeDatabase(self)
+
+    async def index_information(self):
+        return {name: dict(info) for name, info in self.indexes.items()}
+
+    async def create_indexes(self, models):
+        for model in models:
+            doc = dict(model.document)
+            name = doc.pop("name")
+            if self.build_error:
+                error, self.build_error = self.build_error, None
+                raise error
+            self.log.append(("create", name))
+            self.indexes[name] = {**doc, "key": list(doc["key"].items())}
+
+    async def drop_index(self, name):
+        self.log.append(("drop", name))
+        del self.indexes[name]
+
+    def aggregate(self, pipeline, **kwargs):
+        return FakeCursor([{"n": 2}] if self.duplicates else [])
+
+
+def _reconcile(coll, models):
+    return asyncio.run(ensure_indexes({"coll": coll}, {"coll": models}))
+
+
+def test_ttl_zero_is_compared():
+    plain = {"key": [("expires_at", 1)]}
+    ttl = IndexModel([("expires_at", 1)], expireAfterSeconds=0).document
+    assert _spec(plain) != _spec(ttl)
+
+
+def test_converts_to_unique_and_ttl_in_place():
+    coll = FakeCollection({"call_id_1": {"key": [("call_id", 1)]}, "expires_at_1": {"key": [("expires_at", 1)]}})
+    result = _reconcile(coll, [IndexModel([("call_id", 1)], unique=True),
+                               IndexModel([("expires_at", 1)], expireAfterSeconds=0)])
+    assert result == {"created": ["coll.call_id_1", "coll.expires_at_1"], "dropped": [], "failed": []}
+    assert not [entry for entry in coll.log if entry[0] in ("drop", "create")]
+    assert coll.indexes["call_id_1"]["unique"] and coll.indexes["expires_at_1"]["expireAfterSeconds"] == 0
+
+
+def test_duplicates_keep_the_old_index():
+    coll = FakeCollection({"call_id_1": {"key": [("call_id", 1)]}}, duplicates=True)
+    result = _reconcile(coll, [IndexModel([("call_id", 1)], unique=True)])
+    assert result["failed"] == ["coll.call_id_1"]
+    assert "unique" not in coll.indexes["call_id_1"]
+    assert coll.log[-1] == ("collMod", {"name": "call_id_1", "prepareUnique": False})
+
+
+def test_builds_before_dropping_renamed_index():
+    coll = FakeCollection({"status_idx": {"key": [("status", 1)], "sparse": True},
+                           "old_1": {"key": [("old", 1)]}})
+    result = _reconcile(coll, [IndexModel([("status", 1)], partialFilterExpression={"status": "active"})])
+    assert coll.log == [("create", "status_1"), ("drop", "status_idx"), ("drop", "old_1")]
+    assert result["dropped"] == ["coll.status_idx", "coll.old_1"]
+
+
+def test_failed_rebuild_restores_old_index():
+    coll = FakeCollection({"created_at_-1": {"key": [("created_at", -1)]}},
+                          build_error=AutoReconnect("connection reset"))
+    # Same name, different options: has to be dropped before the rebuild
+    result = _reconcile(coll, [IndexModel([("created_at", -1)], partialFilterExpression={"status": "active"})])
+    assert result["failed"] == ["coll.created_at_-1"]
+    assert coll.indexes["created_at_-1"] == {"key": [("created_at", -1)]}
+
+
+@pytest.mark.skipif(not os.environ.get("MONGO_URL"), reason="MONGO_URL not set")
+def test_query_shapes_use_indexes():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+        db = client[f"callpulse_test_{uuid.uuid4().hex[:8]}"]
+        try:
+            result = await ensure_indexes(db)
+            assert not result["failed"]
+            return await explain(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    for collection, query, sort, stages, indexed in asyncio.run(run()):
+        assert indexed, f"{collection} {query} sort={sort}: {' <- '.join(stages)}"
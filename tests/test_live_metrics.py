@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timezone
+
+from live_metrics import LiveMetrics
+
+
+class Cursor:
+    def __init__(self, docs, before=None):
+        self.docs = docs
+        self.before = before
+
+    async def to_list(self, length):
+        if self.before:
+            await self.before()
+        return self.docs
+
+
+class FakeCollection:
+    def __init__(self, docs, before=None, aggregate=None):
+        self.docs = docs
+        self.before = before
+        self.aggregate_result = aggregate or [{"total": [{"n": len(docs)}], "ended": []}]
+
+    def find(self, query, projection=None):
+        return Cursor(self.docs, self.before)
+
+    def aggregate(self, pipeline):
+        return Cursor(self.aggregate_result)
+
+
+class FakeDB:
+    def __init__(self, calls, alerts, before_calls=None):
+        self.calls = FakeCollection(calls, before_calls)
+        self.alerts = FakeCollection(alerts)
+
+
+def _call(call_id, sentiment=0.5):
+    return {"call_id": call_id, "started_at": datetime.now(timezone.utc), "duration_seconds": 30,
+            "health_score": 70, "ai_summary": {"overall_sentiment": sentiment}}
+
+
+def test_reconcile_replays_events_handled_during_its_queries():
+    async def run():
+        metrics = LiveMetrics(None)
+
+        async def events_during_read():
+            # Handled while reconcile awaits Mongo; the snapshot being read predates them
+            metrics.observe({"type": "call_ended", "data": {"call_id": "CALL-1"}})
+            metrics.observe({"type": "alert_acknowledged", "data": {"alert_id": "ALT-1"}})
+            metrics.observe({"type": "call_started", "data": {"call_id": "CALL-3", "health_score": 80}})
+
+        metrics.db = FakeDB([_call("CALL-1"), _call("CALL-2")], [{"alert_id": "ALT-1"}], events_during_read)
+        await metrics.reconcile()
+        return metrics
+
+    metrics = asyncio.run(run())
+    assert set(metrics.calls) == {"CALL-2", "CALL-3"}
+    snapshot = metrics.snapshot()
+    assert snapshot["active_calls"] == 2 and snapshot["alerts_count"] == 0
+    assert snapshot["avg_sentiment"] == 0.25
+    assert metrics._replay is None
+
+
+def test_reconcile_replaces_drifted_state():
+    async def run():
+        metrics = LiveMetrics(FakeDB([_call("CALL-1", sentiment=-0.4)], []))
+        metrics.observe({"type": "call_started", "data": {"call_id": "GHOST", "health_score": 10}})
+        await metrics.reconcile()
+        return metrics
+
+    metrics = asyncio.run(run())
+    assert set(metrics.calls) == {"CALL-1"}
+    assert metrics.snapshot()["avg_sentiment"] == -0.4
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from session_cache import SessionCache
+
+USER = {"user_id": "user_1", "email": "sup@example.com"}
+
+
+class SharedBackend:
+    """In-memory stand-in for RedisSessionBackend shared by several workers."""
+
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, token):
+        return self.entries.get(token)
+
+    async def set(self, token, entry, ttl):
+        self.entries[token] = entry
+
+    async def delete(self, token):
+        self.entries.pop(token, None)
+
+
+def _expires():
+    return datetime.now(timezone.utc) + timedelta(days=7)
+
+
+def test_local_cache_hits_and_invalidates():
+    async def run():
+        cache = SessionCache(ttl=60)
+        await cache.set("st_1", USER, _expires())
+        hit = await cache.get("st_1")
+        await cache.invalidate("st_1")
+        return hit, await cache.get("st_1"), cache
+
+    hit, after, cache = asyncio.run(run())
+    assert hit == USER and after is None
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_logout_on_one_worker_is_seen_by_the_others():
+    async def run():
+        backend = SharedBackend()
+        worker_a, worker_b = SessionCache(backend=backend), SessionCache(backend=backend)
+        await worker_a.set("st_1", USER, _expires())
+        before = await worker_b.get("st_1")
+        await worker_a.invalidate("st_1")
+        return before, await worker_b.get("st_1")
+
+    before, after = asyncio.run(run())
+    assert before == USER and after is None
+
+
+def test_expired_shared_entry_is_a_miss():
+    async def run():
+        backend = SharedBackend()
+        backend.entries["st_1"] = {"user": USER, "expires_at": 0}
+        return await SessionCache(backend=backend).get("st_1")
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timezone
+
+from analytics_rollup import ROLLUP_COLLECTION
+from llm_client import StubLlmClient
+from summary_queue import SummaryQueue
+
+STARTED_AT = datetime(2026, 2, 7, 14, 5, tzinfo=timezone.utc)
+TRANSCRIPT = [
+    {"speaker": "customer", "text": "I was charged twice on my bill."},
+    {"speaker": "agent", "text": "Let me look into that refund for you."},
+]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self.updates = []
+
+    async def find_one_and_update(self, query, update, projection=None):
+        previous = self.docs.get(query.get("call_id"))
+        if previous is not None:
+            self.docs[query["call_id"]] = {**previous, **update["$set"]}
+        return previous
+
+    async def update_one(self, query, update, upsert=False):
+        self.updates.append((query, update))
+
+
+class FakeDB:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class CountingClient(StubLlmClient):
+    def __init__(self, failures=0, issue="Billing Dispute"):
+        super().__init__(latency=0)
+        self.failures = failures
+        self.issue = issue
+        self.requests = []
+
+    async def summarize_batch(self, transcripts):
+        self.requests.append(len(transcripts))
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("LLM unavailable")
+        summaries = await super().summarize_batch(transcripts)
+        return [{**summary, "primary_issue": self.issue} for summary in summaries]
+
+
+def _run(client, calls, **kwargs):
+    """Enqueue (call_id, transcript) pairs, wait for the queue to drain; returns (queue, db, broadcasts)."""
+    db = FakeDB()
+    for call_id, _ in calls:
+        db.calls.docs[call_id] = {"started_at": STARTED_AT, "ai_summary": {"primary_issue": "Billing Dispute"}}
+    broadcasts = []
+
+    async def broadcast(message):
+        broadcasts.append(message)
+
+    async def run():
+        queue = SummaryQueue(db, broadcast, client=client, **{"backoff": 0, **kwargs})
+        await queue.start()
+        try:
+            for call_id, transcript in calls:
+                assert queue.enqueue(call_id, transcript)
+                await asyncio.sleep(0)
+            await queue._queue.join()
+        finally:
+            await queue.stop()
+        return queue
+
+    return asyncio.run(run()), db, broadcasts
+
+
+def test_writes_summary_and_broadcasts():
+    queue, db, broadcasts = _run(CountingClient(), [("CALL-1", TRANSCRIPT)])
+    assert db.calls.docs["CALL-1"]["ai_summary_source"] == "llm"
+    assert [m["type"] for m in broadcasts] == ["call_summary_ready"]
+    assert broadcasts[0]["data"]["call_id"] == "CALL-1"
+    assert queue.completed == 1 and queue.failed == 0
+
+
+def test_identical_transcripts_are_summarized_once():
+    client = CountingClient()
+    queue, _, broadcasts = _run(client, [("CALL-1", TRANSCRIPT), ("CALL-2", list(TRANSCRIPT))], workers=1)
+    assert client.requests == [1]
+    assert queue.cache_hits == 1
+    assert sorted(m["data"]["call_id"] for m in broadcasts) == ["CALL-1", "CALL-2"]
+
+
+def test_inflight_duplicates_share_one_request():
+    client = CountingClient()
+    db, broadcasts = FakeDB(), []
+    for call_id in ("CALL-1", "CALL-2"):
+        db.calls.docs[call_id] = {"started_at": STARTED_AT}
+
+    async def broadcast(message):
+        broadcasts.append(message)
+
+    async def run():
+        queue = SummaryQueue(db, broadcast, client=client, workers=1, batch_size=4, backoff=0)
+        await queue.start()
+        try:
+            # Both queued before the worker runs, so they land in one batch
+            queue.enqueue("CALL-1", TRANSCRIPT)
+            queue.enqueue("CALL-2", list(TRANSCRIPT))
+            await queue._queue.join()
+        finally:
+            await queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+    assert client.requests == [1]
+    assert queue.cache_hits == 1 and queue.completed == 2
+
+
+def test_retries_then_succeeds():
+    client = CountingClient(failures=1)
+    queue, _, broadcasts = _run(client, [("CALL-1", TRANSCRIPT)], retries=2)
+    assert client.requests == [1, 1]
+    assert queue.completed == 1 and len(broadcasts) == 1
+
+
+def test_gives_up_after_retries():
+    client = CountingClient(failures=10)
+    queue, db, broadcasts = _run(client, [("CALL-1", TRANSCRIPT)], retries=2)
+    assert client.requests == [1, 1, 1]
+    assert queue.failed == 1 and queue.completed == 0
+    assert broadcasts == []
+    assert "ai_summary_source" not in db.calls.docs["CALL-1"]
+
+
+def test_moves_rollup_issue_when_llm_reclassifies():
+    _, db, _ = _run(CountingClient(issue="Refund Request"), [("CALL-1", TRANSCRIPT)])
+    assert db[ROLLUP_COLLECTION].updates == [(
+        {"_id": "2026-02-07T14"},
+        {"$inc": {"issues.Billing Dispute": -1, "issues.Refund Request": 1}},
+    )]
+
+
+def test_same_issue_leaves_rollup_alone():
+    _, db, _ = _run(CountingClient(issue="Billing Dispute"), [("CALL-1", TRANSCRIPT)])
+    assert db[ROLLUP_COLLECTION].updates == []
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from ws_manager import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, delay=0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = 0
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        await asyncio.sleep(self.delay)
+        self.sent += 1
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+def test_tick_burst_does_not_drop_client():
+    async def run():
+        manager, ws = ConnectionManager(), FakeSocket()
+        await manager.connect(ws)
+        # One tick at 10k live calls: every call_update is queued before any writer runs
+        for i in range(10000):
+            await manager.broadcast({"type": "call_update", "data": {"call_id": f"CALL-{i}", "health_score": i}})
+        for _ in range(100):
+            if ws.sent == 10000:
+                break
+            await asyncio.sleep(0.05)
+        connected = ws in manager.connections
+        manager.disconnect(ws)
+        return connected, ws
+
+    connected, ws = asyncio.run(run())
+    assert connected and ws.sent == 10000 and ws.closed is None
+
+
+def test_failed_send_closes_and_forgets_socket():
+    async def run():
+        manager, ws = ConnectionManager(), FakeSocket(fail=True)
+        await manager.connect(ws)
+        await manager.broadcast({"type": "call_update", "data": {"call_id": "CALL-1"}})
+        await asyncio.sleep(0.05)
+        return manager, ws
+
+    manager, ws = asyncio.run(run())
+    assert ws.closed == 1011 and ws not in manager.connections
+
+
+def test_lagging_client_is_dropped():
+    async def run():
+        manager, ws = ConnectionManager(), FakeSocket(delay=0.5)
+        await manager.connect(ws)
+        manager.connections[ws].max_lag = 0.05
+        await manager.broadcast({"type": "call_update", "data": {"call_id": "CALL-1"}})
+        await manager.broadcast({"type": "call_update", "data": {"call_id": "CALL-2"}})
+        await asyncio.sleep(0.1)
+        await manager.broadcast({"type": "call_update", "data": {"call_id": "CALL-3"}})
+        in_manager = ws in manager.connections
+        await asyncio.sleep(0.6)
+        return in_manager, ws
+
+    in_manager, ws = asyncio.run(run())
+    assert not in_manager and ws.closed == 1013